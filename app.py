@@ -3,6 +3,10 @@ import traceback
 import streamlit as st
 import json
 import os
+import time
+import uuid
+
+from personalized_learning_coach.utils import jsonfast
 
 # Load .env.local if present (local dev)
 try:
@@ -29,6 +33,18 @@ except Exception as e:
     orchestrator_import_error = e
     orchestrator_import_tb = traceback.format_exc()
 
+
+# Every visitor gets a fresh user_id, so cached orchestrators are bounded and expire;
+# state is saved every turn, so an evicted one is rebuilt from the store on demand
+ORCHESTRATOR_CACHE_ENTRIES = 256
+ORCHESTRATOR_CACHE_TTL = "2h"
+
+
+@st.cache_resource(max_entries=ORCHESTRATOR_CACHE_ENTRIES, ttl=ORCHESTRATOR_CACHE_TTL)
+def get_orchestrator(user_id: str):
+    """Build one OrchestratorAgent per user and reuse it across reruns and sessions."""
+    return OrchestratorAgent(user_id=user_id)
+
 # Initialize session state
 if "chats" not in st.session_state:
     st.session_state.chats = {}  # {plan_id: [messages]}
@@ -51,18 +67,16 @@ if "orchestrator" not in st.session_state:
                 st.session_state.user_id = url_user_id
             elif "user_id" not in st.session_state:
                 # 2. Generate new ID if not in URL or session
-                import uuid
                 new_id = str(uuid.uuid4())
                 st.session_state.user_id = new_id
                 # 3. Save to URL for future refreshes
                 st.query_params["user_id"] = new_id
             
-            # Initialize Orchestrator with the persistent ID
-            st.session_state.orchestrator = OrchestratorAgent(user_id=st.session_state.user_id)
+            # Reuse the cached Orchestrator for this persistent ID
+            st.session_state.orchestrator = get_orchestrator(st.session_state.user_id)
         except Exception as e:
             st.session_state.orchestrator = None
-            orchestrator_init_error = e
-            orchestrator_init_tb = traceback.format_exc()
+            st.session_state.orchestrator_init_tb = traceback.format_exc()
     else:
         st.session_state.orchestrator = None
 
@@ -74,13 +88,60 @@ if not ORCHESTRATOR_AVAILABLE:
 if ORCHESTRATOR_AVAILABLE and st.session_state.orchestrator is None:
     st.warning("OrchestratorAgent failed to initialize. See details below.")
     with st.expander("Init error"):
-        st.code(orchestrator_init_tb)
+        st.code(st.session_state.get("orchestrator_init_tb", ""))
 
 
 orch = st.session_state.orchestrator
 
+# Number of most recent chat messages rendered on each rerun
+VISIBLE_MESSAGES = 30
+
+# Minimum seconds between UI updates while streaming a reply (~20 Hz)
+STREAM_FLUSH_INTERVAL = 0.05
+
+
+def _throttled(chunks, interval: float):
+    """Coalesce streamed chunks so the chat message re-renders at most once per interval."""
+    buffer = []
+    last_flush = time.monotonic()
+    for chunk in chunks:
+        buffer.append(chunk)
+        now = time.monotonic()
+        if now - last_flush >= interval:
+            yield "".join(buffer)
+            buffer.clear()
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+
+def _pretty_json(content):
+    """Pretty-printed JSON for a reply, or None when it is not a JSON document."""
+    try:
+        return json.dumps(json.loads(content), indent=2, ensure_ascii=False)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def _assistant_message(content: str) -> dict:
+    """Build an assistant message with its display form precomputed under `_pretty`."""
+    return {"role": "assistant", "content": content, "_pretty": _pretty_json(content)}
+
+
 # --- Sidebar for Plan & Progress ---
-with st.sidebar:
+NEW_PLAN_OPTION = "Create New / General"
+
+
+@st.fragment
+def render_sidebar(orch):
+    """Render plan and week selection.
+
+    Runs as a fragment so sidebar interactions re-execute only this function.
+    When a selection changes which chat is shown, the whole app is rerun once.
+    """
+    if st.session_state.pop("chat_context_changed", False):
+        st.rerun()
+
     st.header("My Learning Paths")
 
     if orch: # Check if orchestrator is initialized before accessing its state
@@ -88,8 +149,13 @@ with st.sidebar:
         plans = orch.state.get("plans", {})
         
         # 1. Plan Selection (Dropdown)
-        plan_options = {p_id: p_data["main_topic"] for p_id, p_data in plans.items()}
-        options_list = ["Create New / General"] + list(plan_options.values())
+        plan_options = {}
+        topic_to_id = {}  # first plan wins when topics collide, as the old scan did
+        for p_id, p_data in plans.items():
+            topic = p_data["main_topic"]
+            plan_options[p_id] = topic
+            topic_to_id.setdefault(topic, p_id)
+        options_list = [NEW_PLAN_OPTION] + list(plan_options.values())
         
         active_id = orch.state.get("active_plan_id")
         current_selection_index = 0
@@ -98,29 +164,30 @@ with st.sidebar:
             if current_topic in options_list:
                 current_selection_index = options_list.index(current_topic)
 
-        selected_option = st.selectbox(
+        # SYNC LOGIC: Backend -> Frontend (e.g. a plan was created from the chat)
+        if st.session_state.get("last_backend_plan_id", "") != active_id:
+            st.session_state["plan_selector"] = options_list[current_selection_index]
+            st.session_state["last_backend_plan_id"] = active_id
+
+        # Callback for User Interaction: switch plans before the fragment reruns
+        def on_plan_change():
+            selected = st.session_state.plan_selector
+            if selected == NEW_PLAN_OPTION:
+                orch.state["active_plan_id"] = None
+            else:
+                target_id = topic_to_id.get(selected)
+                if target_id:
+                    orch.switch_plan(target_id)
+            st.session_state["last_backend_plan_id"] = orch.state.get("active_plan_id")
+            st.session_state["chat_context_changed"] = True
+
+        st.selectbox(
             "Select Learning Path:",
             options_list,
-            index=current_selection_index
+            key="plan_selector",
+            on_change=on_plan_change
         )
 
-        # Handle Plan Switching
-        if selected_option == "Create New / General":
-            if active_id is not None:
-                orch.state["active_plan_id"] = None
-                st.rerun()
-        else:
-            # Find ID for selected topic
-            target_id = None
-            for pid, topic in plan_options.items():
-                if topic == selected_option:
-                    target_id = pid
-                    break
-            
-            if target_id and target_id != active_id:
-                orch.switch_plan(target_id)
-                st.rerun()
-
         st.divider()
 
         # 2. Week Selection (Radio)
@@ -128,17 +195,17 @@ with st.sidebar:
         if ctx:
             st.subheader(f"Plan: {ctx.get('main_topic')}")
             
-            plan_data = ctx.get("data", {})
-            weeks = plan_data.get("weeks", [])
-            if not weeks:
-                # Fallback: Check top-level (Orchestrator stores it flat)
-                weeks = ctx.get("weeks", [])
+            weeks = ctx.get("weeks", [])
             
             if weeks:
-                week_labels = []
-                for i, w in enumerate(weeks):
-                    topic = w.get("topic", "Unknown")
-                    week_labels.append(f"Week {i+1}: {topic}")
+                # Labels and their label -> index map only change with the plan's structure
+                cache_key = (ctx["id"], len(weeks))
+                cached = st.session_state.get("week_label_cache")
+                if not cached or cached[0] != cache_key:
+                    labels = [f"Week {i+1}: {w.get('topic', 'Unknown')}" for i, w in enumerate(weeks)]
+                    cached = (cache_key, labels, {label: i for i, label in enumerate(labels)})
+                    st.session_state["week_label_cache"] = cached
+                _, week_labels, label_to_idx = cached
                 
                 current_week_idx = ctx.get("active_week_index", 0)
                 # Ensure index is valid
@@ -159,11 +226,12 @@ with st.sidebar:
                 # Callback for User Interaction
                 def on_week_change():
                     selected = st.session_state.week_selector
-                    if selected in week_labels:
-                        new_idx = week_labels.index(selected)
+                    if selected in label_to_idx:
+                        new_idx = label_to_idx[selected]
                         orch.switch_week(ctx["id"], new_idx)
                         # Update tracker so we don't re-sync on next run
                         st.session_state["last_backend_week_idx"] = new_idx
+                        st.session_state["chat_context_changed"] = True
                 
                 # Render Widget
                 selected_week = st.radio(
@@ -175,10 +243,7 @@ with st.sidebar:
                 )
                 
                 # Determine index for display
-                if selected_week in week_labels:
-                    new_week_idx = week_labels.index(selected_week)
-                else:
-                    new_week_idx = current_week_idx
+                new_week_idx = label_to_idx.get(selected_week, current_week_idx)
 
                 # Show objectives for selected week
                 st.info(f"**Current Focus:**\n{weeks[new_week_idx].get('topic')}")
@@ -193,6 +258,10 @@ with st.sidebar:
             st.info("No active plan selected. Ask to create one!")
     else:
         st.info("Orchestrator not available. Sidebar features are limited.")
+
+
+with st.sidebar:
+    render_sidebar(orch)
 # -----------------------------------
 
 # Determine which chat history to show
@@ -205,13 +274,23 @@ if orch:
         w_idx = ctx.get("active_week_index", 0)
         chat_key = f"{active_id}_w{w_idx}"
 
+# Persisted histories read during this script run, so each is fetched at most once
+_hist_cache: dict = {}
+
+
+def _load_history(key: str) -> list:
+    if key not in _hist_cache:
+        _hist_cache[key] = (orch.get_chat_history(key) if orch else None) or []
+    return _hist_cache[key]
+
+
 # Ensure chat history is loaded from persistence
 if chat_key not in st.session_state.chats:
     st.session_state.chats[chat_key] = []
     
     if orch:
         # Load from Orchestrator persistence
-        saved_chats = orch.get_chat_history(chat_key)
+        saved_chats = _load_history(chat_key)
         if saved_chats:
             st.session_state.chats[chat_key] = saved_chats
         elif active_id:
@@ -222,23 +301,35 @@ if chat_key not in st.session_state.chats:
 
 # Double check: If session state is empty but persistence has data (e.g. page refresh)
 if not st.session_state.chats[chat_key] and orch:
-     saved_chats = orch.get_chat_history(chat_key)
+     saved_chats = _load_history(chat_key)
      if saved_chats:
          st.session_state.chats[chat_key] = saved_chats
 
 current_messages = st.session_state.chats[chat_key]
 
-# Display chat messages
-for message in current_messages:
+# Display chat messages (only the most recent window; older ones load on demand)
+if "history_offset" not in st.session_state:
+    st.session_state.history_offset = {}  # {chat_key: extra messages shown}
+
+visible_count = VISIBLE_MESSAGES + st.session_state.history_offset.get(chat_key, 0)
+hidden_count = len(current_messages) - visible_count
+if hidden_count > 0:
+    if st.button(f"Load earlier messages ({hidden_count} hidden)", key=f"load_earlier_{chat_key}"):
+        st.session_state.history_offset[chat_key] = visible_count
+        st.rerun()
+
+for message in current_messages[-visible_count:]:
     role = message["role"]
     content = message.get("content") or message.get("text") or ""
 
     with st.chat_message(role):
         if role == "assistant":
-            try:
-                parsed = json.loads(content)
-                st.code(json.dumps(parsed, indent=2, ensure_ascii=False))
-            except (json.JSONDecodeError, TypeError):
+            # Messages loaded from disk carry no `_pretty`; compute it once on first render
+            if "_pretty" not in message:
+                message["_pretty"] = _pretty_json(content)
+            if message["_pretty"] is not None:
+                st.code(message["_pretty"])
+            else:
                 st.markdown(content)
         else:
             st.markdown(content)
@@ -281,37 +372,36 @@ if orch and orch.state.get("assessment_in_progress"):
             if submitted:
                 # Serialize answers to JSON
                 # st.sidebar.write("Debug Answers:", answers) # Uncomment for debugging
-                payload = json.dumps(answers)
+                payload = jsonfast.dumps(answers)
                 
                 # Add user message (hidden or summary)
-                st.session_state.chats[chat_key].append({"role": "user", "content": "Submitted Assessment"})
+                user_msg = {"role": "user", "content": "Submitted Assessment"}
+                st.session_state.chats[chat_key].append(user_msg)
                 if orch:
-                    orch.save_chat_history(chat_key, st.session_state.chats[chat_key])
+                    orch.append_chat_message(chat_key, user_msg)
                 
+                needs_rerun = False
                 try:
                     # Run orchestrator with JSON payload
                     resp = orch.run(payload)
                     
                     # Display response
-                    st.session_state.chats[chat_key].append({"role": "assistant", "content": str(resp)})
+                    assistant_msg = _assistant_message(str(resp))
+                    st.session_state.chats[chat_key].append(assistant_msg)
                     if orch:
-                        orch.save_chat_history(chat_key, st.session_state.chats[chat_key])
-                    
-                    # Check if we advanced weeks (Assessment Passed)
-                    new_active_id = orch.state.get("active_plan_id")
-                    if new_active_id:
-                        new_ctx = orch.state["plans"].get(new_active_id, {})
-                        new_w_idx = new_ctx.get("active_week_index", 0)
-                        new_chat_key = f"{new_active_id}_w{new_w_idx}"
-                        
-                        if new_chat_key != chat_key:
-                            # We advanced! Force rerun to switch context immediately
-                            st.rerun()
+                        orch.append_chat_message(chat_key, assistant_msg)
+                        orch.flush_chat_history()  # one transcript write per turn
 
-                    st.rerun()
+                    # The form closes once graded, and a passed assessment may also have
+                    # advanced the week; a single rerun picks up either change.
+                    needs_rerun = True
                 except Exception as e:
+                    orch.flush_chat_history()
                     st.error(f"Error submitting assessment: {e}")
 
+                if needs_rerun:
+                    st.rerun()
+
 else:
     # Standard Chat Input
     if prompt := st.chat_input("Type your message..."):
@@ -319,30 +409,30 @@ else:
         current_key = chat_key 
         
         # Add user message to chat history
-        st.session_state.chats[current_key].append({"role": "user", "content": prompt})
+        user_msg = {"role": "user", "content": prompt}
+        st.session_state.chats[current_key].append(user_msg)
         if orch:
-            orch.save_chat_history(current_key, st.session_state.chats[current_key])
+            orch.append_chat_message(current_key, user_msg)
             
         with st.chat_message("user"):
             st.markdown(prompt)
 
         # Process with Orchestrator
         reply_text = "Sorry — I couldn't process your request."
+        reply_recorded = False
         if orch:
             try:
-                with st.spinner("Thinking..."):
-                    resp = orch.run(prompt)
-                
-                if isinstance(resp, dict):
-                    reply_text = json.dumps(resp, ensure_ascii=False)
-                else:
-                    reply_text = str(resp)
+                # Stream the reply; it is persisted once the stream completes
+                with st.chat_message("assistant"):
+                    with st.spinner("Thinking..."):
+                        reply_text = st.write_stream(_throttled(orch.stream(prompt), STREAM_FLUSH_INTERVAL))
 
                 # Check if plan/week changed during run (e.g. created new plan or advanced week)
                 new_active_id = orch.state.get("active_plan_id")
                 
                 # Determine TARGET chat key for response
                 target_key = current_key
+                context_changed = new_active_id != active_id
                 if new_active_id:
                     new_ctx = orch.state["plans"].get(new_active_id, {})
                     new_w_idx = new_ctx.get("active_week_index", 0)
@@ -350,6 +440,7 @@ else:
                     
                     # If we changed weeks/plans, the response belongs to the NEW context
                     if new_chat_key != current_key:
+                        context_changed = True
                         # Only switch if it's a week advancement within the SAME plan
                         # OR if it's a brand new plan creation (which we can infer if current was 'default')
                         if new_active_id == active_id or current_key == "default":
@@ -360,7 +451,7 @@ else:
                              if new_active_id == active_id:
                                  # Reconstruct the label (assuming format matches sidebar)
                                  # We need the topic.
-                                 new_weeks = new_ctx.get("data", {}).get("weeks", [])
+                                 new_weeks = new_ctx.get("weeks", [])
                                  if new_w_idx < len(new_weeks):
                                      new_topic = new_weeks[new_w_idx].get("topic", "Unknown")
                                      new_label = f"Week {new_w_idx+1}: {new_topic}"
@@ -369,20 +460,26 @@ else:
                 # Ensure target chat exists
                 if target_key not in st.session_state.chats:
                     st.session_state.chats[target_key] = []
-                    saved = orch.get_chat_history(target_key)
+                    saved = _load_history(target_key)
                     if saved:
                          st.session_state.chats[target_key] = saved
 
                 # Add response to TARGET chat
-                st.session_state.chats[target_key].append({"role": "assistant", "content": reply_text})
-                orch.save_chat_history(target_key, st.session_state.chats[target_key])
+                assistant_msg = _assistant_message(reply_text)
+                st.session_state.chats[target_key].append(assistant_msg)
+                orch.append_chat_message(target_key, assistant_msg)
 
                 # If we switched FROM default (General) to a specific plan, CLEAR default chat
                 if current_key == "default" and target_key != "default":
                     st.session_state.chats["default"] = []
                     orch.save_chat_history("default", [])
 
-                st.rerun()
+                orch.flush_chat_history()  # one transcript write per turn
+                reply_recorded = True
+
+                # The reply was already streamed inline; only a context switch needs a fresh pass
+                if context_changed:
+                    st.rerun()
                     
             except Exception as e:
                 reply_text = f"[Error running orchestrator]: {e}"
@@ -399,13 +496,14 @@ else:
             else:
                 reply_text = "I would normally route your input to the OrchestratorAgent, but it's not available. Try asking for a plan."
 
-        # Add assistant response to CURRENT chat (if we didn't switch)
-        st.session_state.chats[chat_key].append({"role": "assistant", "content": reply_text})
-        if orch:
-            orch.save_chat_history(chat_key, st.session_state.chats[chat_key])
-            
-        with st.chat_message("assistant"):
-            st.markdown(reply_text)
-        
-        st.rerun()
+        # Fallback/error reply: add it to the CURRENT chat and show it inline
+        if not reply_recorded:
+            assistant_msg = _assistant_message(reply_text)
+            st.session_state.chats[chat_key].append(assistant_msg)
+            if orch:
+                orch.append_chat_message(chat_key, assistant_msg)
+                orch.flush_chat_history()
+
+            with st.chat_message("assistant"):
+                st.markdown(reply_text)
 
@@ -1,11 +1,35 @@
 # observability/logger.py
 import logging
+import time
+from functools import lru_cache
+
+@lru_cache(maxsize=1024)
+def _local_seconds(sec: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+
+@lru_cache(maxsize=1024)
+def _utc_seconds(sec: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+
+def utc_iso(ts: float) -> str:
+    """UTC ISO-8601 timestamp (same shape as datetime.utcnow().isoformat())."""
+    sec = int(ts)
+    return f"{_utc_seconds(sec)}.{int((ts - sec) * 1_000_000):06d}"
+
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders asctime from a per-second cache."""
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        return f"{_local_seconds(int(record.created))},{int(record.msecs):03d}"
+
+@lru_cache(maxsize=None)
 def get_logger(name: str):
     logger = logging.getLogger(name)
     if not logger.handlers:
         h = logging.StreamHandler()
-        fmt = logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s")
+        fmt = _CachedTimeFormatter("%(asctime)s %(name)s %(levelname)s: %(message)s")
         h.setFormatter(fmt)
         logger.addHandler(h)
         logger.setLevel(logging.INFO)
-    return logger
\ No newline at end of file
+    return logger
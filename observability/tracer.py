@@ -1,27 +1,65 @@
+import atexit
 import functools
-import json
+import inspect
+import queue
+import reprlib
+import threading
 import time
-from datetime import datetime
-from observability.logger import get_logger
+import uuid
+from contextvars import ContextVar
+from observability.logger import get_logger, utc_iso
+from personalized_learning_coach.utils import jsonfast
 
 logger = get_logger("Tracer")
 
+ARG_PREVIEW_CHARS = 200
+RESULT_PREVIEW_CHARS = 500
+
+# Arguments are logged via repr() so strings and containers stay distinguishable;
+# reprlib stops formatting once a value hits these limits instead of building
+# the full repr of a large payload and slicing it afterwards.
+_ARG_REPR = reprlib.Repr()
+_ARG_REPR.maxstring = ARG_PREVIEW_CHARS
+_ARG_REPR.maxother = ARG_PREVIEW_CHARS
+_ARG_REPR.maxlist = _ARG_REPR.maxtuple = _ARG_REPR.maxset = 10
+_ARG_REPR.maxdict = 10
+_ARG_REPR.maxlevel = 3
+
+# Shared by nested traced calls so one user turn correlates under a single id
+_trace_id_ctx: ContextVar = ContextVar("trace_id", default=None)
+
+def current_trace_id():
+    """Trace id of the enclosing traced call, or None outside of one."""
+    return _trace_id_ctx.get()
+
+def _preview(text, limit):
+    return text[:limit] + "..." if len(text) > limit else text
+
 def trace_agent(func):
     """Decorator to trace agent execution inputs and outputs."""
+    if inspect.isgeneratorfunction(func):
+        return _trace_generator(func)
+
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
         agent_name = self.__class__.__name__
         method_name = func.__name__
         start_time = time.time()
+        trace_id = _trace_id_ctx.get()
+        token = None
+        if trace_id is None:
+            trace_id = uuid.uuid4().hex
+            token = _trace_id_ctx.set(trace_id)
         
         # Log Entry
         entry_log = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utc_iso(time.time()),
+            "trace_id": trace_id,
             "event": "agent_start",
             "agent": agent_name,
             "method": method_name,
-            "args": [str(a) for a in args],
-            "kwargs": {k: str(v) for k, v in kwargs.items()}
+            "args": [_ARG_REPR.repr(a) for a in args],
+            "kwargs": {k: _ARG_REPR.repr(v) for k, v in kwargs.items()}
         }
         _log_trace(entry_log)
         
@@ -31,12 +69,13 @@ def trace_agent(func):
             # Log Success
             duration = time.time() - start_time
             exit_log = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": utc_iso(time.time()),
+                "trace_id": trace_id,
                 "event": "agent_end",
                 "agent": agent_name,
                 "method": method_name,
                 "duration_seconds": duration,
-                "result": str(result)[:500] + "..." if len(str(result)) > 500 else str(result)
+                "result": _preview(str(result), RESULT_PREVIEW_CHARS)
             }
             _log_trace(exit_log)
             return result
@@ -45,7 +84,8 @@ def trace_agent(func):
             # Log Error
             duration = time.time() - start_time
             error_log = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": utc_iso(time.time()),
+                "trace_id": trace_id,
                 "event": "agent_error",
                 "agent": agent_name,
                 "method": method_name,
@@ -54,13 +94,115 @@ def trace_agent(func):
             }
             _log_trace(error_log)
             raise e
+        finally:
+            if token is not None:
+                _trace_id_ctx.reset(token)
             
     return wrapper
 
+def _trace_generator(func):
+    """trace_agent for generator methods: the call ends when the generator is exhausted.
+
+    The trace id is only set while the generator body runs, so it does not
+    leak into the consumer between chunks. The logged result is the joined output.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        agent_name = self.__class__.__name__
+        method_name = func.__name__
+        start_time = time.time()
+        trace_id = _trace_id_ctx.get() or uuid.uuid4().hex
+        _log_trace({
+            "timestamp": utc_iso(time.time()),
+            "trace_id": trace_id,
+            "event": "agent_start",
+            "agent": agent_name,
+            "method": method_name,
+            "args": [_ARG_REPR.repr(a) for a in args],
+            "kwargs": {k: _ARG_REPR.repr(v) for k, v in kwargs.items()}
+        })
+        gen = func(self, *args, **kwargs)
+        parts = []
+        try:
+            while True:
+                token = _trace_id_ctx.set(trace_id)
+                try:
+                    chunk = next(gen)
+                except StopIteration:
+                    break
+                finally:
+                    _trace_id_ctx.reset(token)
+                parts.append(str(chunk))
+                yield chunk
+        except Exception as e:
+            _log_trace({
+                "timestamp": utc_iso(time.time()),
+                "trace_id": trace_id,
+                "event": "agent_error",
+                "agent": agent_name,
+                "method": method_name,
+                "duration_seconds": time.time() - start_time,
+                "error": str(e)
+            })
+            raise
+        finally:
+            gen.close()
+        _log_trace({
+            "timestamp": utc_iso(time.time()),
+            "trace_id": trace_id,
+            "event": "agent_end",
+            "agent": agent_name,
+            "method": method_name,
+            "duration_seconds": time.time() - start_time,
+            "result": _preview("".join(parts), RESULT_PREVIEW_CHARS)
+        })
+
+    return wrapper
+
+TRACE_PATH = "traces.jsonl"
+TRACE_FLUSH_INTERVAL = 0.1  # seconds between background flushes
+TRACE_BATCH_SIZE = 64  # flush early once this many records are queued
+
+_trace_q: "queue.Queue[dict]" = queue.Queue()
+_write_lock = threading.Lock()
+
+_wake = threading.Event()
+
 def _log_trace(data):
-    """Append trace data to a JSONL file."""
+    """Queue trace data for the background writer (never touches disk)."""
+    _trace_q.put_nowait(data)
+    if _trace_q.qsize() >= TRACE_BATCH_SIZE:
+        _wake.set()
+
+def _drain():
+    """Pop every queued record without blocking."""
+    batch = []
+    while True:
+        try:
+            batch.append(_trace_q.get_nowait())
+        except queue.Empty:
+            return batch
+
+def _write_batch(batch):
+    """Append a batch of trace records to the JSONL file in one write."""
+    if not batch:
+        return
     try:
-        with open("traces.jsonl", "a") as f:
-            f.write(json.dumps(data) + "\n")
+        payload = b"".join(jsonfast.dumpb(r) + b"\n" for r in batch)
+        with _write_lock, open(TRACE_PATH, "ab") as f:
+            f.write(payload)
     except Exception as e:
-        logger.error(f"Failed to write trace: {e}")
\ No newline at end of file
+        logger.error(f"Failed to write trace: {e}")
+
+def _trace_writer():
+    while True:
+        _wake.wait(TRACE_FLUSH_INTERVAL)
+        _wake.clear()
+        _write_batch(_drain())
+
+def flush_traces():
+    """Synchronously write every queued trace record."""
+    _write_batch(_drain())
+
+threading.Thread(target=_trace_writer, name="trace-writer", daemon=True).start()
+atexit.register(flush_traces)
@@ -1,25 +1,50 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-import json
+import asyncio
+import copy
+import logging
+import os
 import re
-from personalized_learning_coach.memory.kv_store import append_event, put, get, compact_session
-from personalized_learning_coach.tools.grader_tool import grade_question
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from personalized_learning_coach.memory.kv_store import append_event, append_events, put, put_batch, get, compact_session, needs_compact
+from personalized_learning_coach.tools.grader_tool import grade_questions_batch
+from personalized_learning_coach.utils import jsonfast
+from personalized_learning_coach.utils.cache import LRUCache
 from personalized_learning_coach.utils.llm_client import LLMClient
 from observability.logger import get_logger
 from observability.tracer import trace_agent
 
 logger = get_logger("AssessmentAgent")
 
+# Parsed questions per (topic, model); repeated topics skip the LLM round trip
+QUESTION_CACHE_TTL = 3600
+_QUESTION_CACHE = LRUCache(maxsize=128, ttl=QUESTION_CACHE_TTL)
+
+# Quizzes generated ahead of time (see prefetch_questions), keyed like the cache
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quiz-prefetch")
+_IN_FLIGHT: Dict[tuple, Future] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
+# Minimum number of new session events between two compactions
+COMPACT_INTERVAL = 10
+
+# arun() grades free-form answers in batches of GRADER_BATCH_SIZE, with at
+# most GRADER_CONCURRENCY batches in flight
+GRADER_BATCH_SIZE = 4
+GRADER_CONCURRENCY = int(os.environ.get("GRADER_CONCURRENCY", "8"))
+
+_JSON_BLOCK_RE = re.compile(r"```json(.*?)```", re.DOTALL)
+
 class AssessmentAgent:
     """Agent responsible for generating and grading assessments."""
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, llm_client: Optional[LLMClient] = None):
         self.user_id = user_id
         self.session_ns = f"session:{user_id}"
-        self.llm = LLMClient()
+        self.llm = llm_client or LLMClient()
 
-    def _generate_questions(self, topic: str = "General Knowledge") -> List[Dict[str, Any]]:
-        """Generates diagnostic questions for a given topic."""
-        prompt = (
+    def _questions_prompt(self, topic: str) -> str:
+        return (
             f"Generate 3 high-quality diagnostic multiple-choice questions for the topic '{topic}'. "
             "Guidelines:\n"
             "1. Questions must be UNAMBIGUOUS and FACTUALLY CORRECT.\n"
@@ -32,33 +57,78 @@ class AssessmentAgent:
             "STRICTLY return a JSON list of objects with keys: qid, prompt, options (dict with keys A,B,C,D), answer (A/B/C/D), explanation. "
             "Do NOT generate open-ended or short-answer questions."
         )
+
+    def prefetch_questions(self, topic: str) -> None:
+        """Start generating the quiz for topic in the background so a later run() finds it cached."""
+        key = (topic, self.llm.model)
+        with _IN_FLIGHT_LOCK:
+            if key in _IN_FLIGHT or _QUESTION_CACHE.get(key) is not None:
+                return
+            future = _IN_FLIGHT[key] = _PREFETCH_POOL.submit(self._fetch_questions, topic, key)
+        future.add_done_callback(lambda _f: _IN_FLIGHT.pop(key, None))
+
+    def _generate_questions(self, topic: str = "General Knowledge") -> List[Dict[str, Any]]:
+        """Generates diagnostic questions for a given topic."""
+        key = (topic, self.llm.model)
+        cached = _QUESTION_CACHE.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        pending = _IN_FLIGHT.get(key)
+        if pending is not None:
+            try:
+                return copy.deepcopy(pending.result())
+            except Exception: # pylint: disable=broad-exception-caught
+                logger.exception("Prefetched quiz failed; generating again")
+        return self._fetch_questions(topic, key)
+
+    def _fetch_questions(self, topic: str, key: tuple) -> List[Dict[str, Any]]:
+        """Ask the LLM for questions on topic and cache them under key."""
         try:
-            resp = self.llm.generate_content(prompt, system_instruction="Assessment Generator")
-            # Robust JSON Extraction
-            questions = [] # Initialize questions to an empty list
-            clean = resp.strip()
-            
-            # 1. Try to find JSON list markers
-            start_idx = clean.find("[")
-            end_idx = clean.rfind("]")
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_str = clean[start_idx : end_idx + 1]
-                try:
-                    questions = json.loads(json_str)
-                except json.JSONDecodeError:
-                    # Try to fix common JSON issues if needed, or just fail
-                    logger.warning("JSON decode failed on extracted string: %s...", json_str[:50])
-            
+            resp = self.llm.generate_content(self._questions_prompt(topic), system_instruction="Assessment Generator")
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Failed to generate questions: %s", e)
+            return self._fallback_questions(topic)
+        return self._remember_questions(key, self._parse_questions(resp), topic)
+
+    async def _agenerate_questions(self, topic: str = "General Knowledge") -> List[Dict[str, Any]]:
+        """Async variant of _generate_questions."""
+        key = (topic, self.llm.model)
+        cached = _QUESTION_CACHE.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        try:
+            resp = await self.llm.agenerate_content(self._questions_prompt(topic), system_instruction="Assessment Generator")
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Failed to generate questions: %s", e)
+            return self._fallback_questions(topic)
+        return self._remember_questions(key, self._parse_questions(resp), topic)
+
+    def _remember_questions(self, key, questions: Optional[List[Dict[str, Any]]], topic: str) -> List[Dict[str, Any]]:
+        """Cache successfully parsed questions; fall back to generic MCQs (never cached)."""
+        if questions is None:
+            return self._fallback_questions(topic)
+        _QUESTION_CACHE.put(key, copy.deepcopy(questions))
+        return questions
+
+    def _parse_questions(self, resp: Any) -> Optional[List[Dict[str, Any]]]:
+        """Extract the question list from an LLM reply, or None if there is none."""
+        try:
+            if isinstance(resp, list):
+                # The LLM client already returned structured output
+                questions = resp
+            else:
+                # Robust JSON Extraction: decode the first list in the reply in one scan
+                clean = resp.strip()
+                questions = jsonfast.extract(clean, "[")
+
             if not isinstance(questions, list):
                  # Fallback: try parsing as markdown code block if not found above
-                 if "```json" in clean:
-                     match = re.search(r"```json(.*?)```", clean, re.DOTALL)
-                     if match:
-                         try:
-                             questions = json.loads(match.group(1))
-                         except json.JSONDecodeError:
-                             pass
+                 match = _JSON_BLOCK_RE.search(clean)
+                 if match:
+                     try:
+                         questions = jsonfast.loads(match.group(1))
+                     except jsonfast.JSONDecodeError:
+                         logger.warning("JSON decode failed on fenced block: %s...", match.group(1)[:50])
 
             if isinstance(questions, list) and len(questions) > 0:
                 # Ensure qids are unique/present and STRINGS
@@ -72,8 +142,10 @@ class AssessmentAgent:
             logger.error("Failed to parse questions. Raw response: %s", resp)
         except Exception as e: # pylint: disable=broad-exception-caught
             logger.error("Failed to generate questions: %s", e)
-        
-        # Fallback (Generic MCQs)
+        return None
+
+    def _fallback_questions(self, topic: str) -> List[Dict[str, Any]]:
+        """Generic MCQs used when no usable questions come back from the LLM."""
         return [
             {
                 "qid": "q1", 
@@ -104,84 +176,172 @@ class AssessmentAgent:
         if not answers:
             append_event(self.session_ns, {"role":"agent","type":"assessment_started","content":{"message":f"Assessment started for {topic}","time":datetime.utcnow().isoformat()}})
             questions = self._generate_questions(topic)
-            put(self.session_ns, "questions", questions)
+            self._store_questions(questions)
             return {"status":"ok", "phase":"questions", "questions": questions}
         
         # grade answers
         if not isinstance(answers, dict):
             answers = {}
         
-        # Prefer questions from payload, then session
-        questions = payload.get("questions") or get(self.session_ns, "questions") or []
-        results = []
-        total = 0.0
-        for q in questions:
-            qid = str(q.get("qid")) # Force string for lookup
-            expected = q.get("answer") or q.get("expected") # support both new and old format
-            
-            # Debug: Log lookup attempt
-            logger.info(f"Looking up answer for QID: '{qid}' in answers keys: {list(answers.keys())}")
-            
-            user_ans_raw = answers.get(qid, "").strip()
-            # Extract just the letter if it looks like "A) ..." or "A. ..."
-            user_ans = user_ans_raw.upper()
-            if len(user_ans) > 1 and user_ans[1] in [")", "."]:
-                user_ans = user_ans[0]
-            elif len(user_ans) > 2 and user_ans[0] in "ABCD" and user_ans[1] in [")", "."]:
-                 user_ans = user_ans[0]
-            
-            # If user_ans is still long, maybe it's the full text without prefix?
-            # In that case, we can't easily match against "A", unless we reverse lookup.
-            # But app.py sends "A) Text", so the prefix check should work.
-            
-            # Debug Logging
-            logger.info(f"Grading QID: {qid} | User Raw: '{user_ans_raw}' | Parsed: '{user_ans}' | Expected: '{expected}'")
+        questions_by_qid = self._questions_by_qid(payload)
+        graded = self._grade_all(questions_by_qid, answers)
+        return self._finalize(graded, topic)
 
-            # Simple MCQ grading
-            is_correct = False
-            score = 0.0
-            feedback = ""
-            
-            if expected and len(expected) == 1 and expected in "ABCD":
-                # It's an MCQ
-                # 1. Direct match of letter
-                if user_ans == expected:
-                    is_correct = True
-                # 2. Fallback: Check if user answer STARTS with expected letter (e.g. "A) ...")
-                elif user_ans_raw.upper().startswith(f"{expected})") or user_ans_raw.upper().startswith(f"{expected}."):
-                    is_correct = True
-                
-                score = 1.0 if is_correct else 0.0
-                feedback = q.get("explanation", "") if not is_correct else "Correct!"
+    async def arun(self, payload: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Async variant of run(): awaits the async LLM client and grades in a worker thread."""
+        if payload is None:
+            payload = {}
+        answers = payload.get("answers")
+        topic = payload.get("topic", "General Knowledge")
+
+        if not answers:
+            append_event(self.session_ns, {"role":"agent","type":"assessment_started","content":{"message":f"Assessment started for {topic}","time":datetime.utcnow().isoformat()}})
+            questions = await self._agenerate_questions(topic)
+            self._store_questions(questions)
+            return {"status":"ok", "phase":"questions", "questions": questions}
+        if not isinstance(answers, dict):
+            answers = {}
+
+        questions_by_qid = self._questions_by_qid(payload)
+        graded = await self._agrade_all(questions_by_qid, answers)
+        return await asyncio.to_thread(self._finalize, graded, topic)
+
+    def _store_questions(self, questions: List[Dict[str, Any]]) -> None:
+        """Persist the question list plus a qid -> question index for grading."""
+        put_batch(self.session_ns, {
+            "questions": questions,
+            "questions_by_qid": {str(q.get("qid")): q for q in questions},
+        })
+
+    def _questions_by_qid(self, payload: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Questions to grade keyed by string qid: payload first, then the session."""
+        questions = payload.get("questions")
+        if questions:
+            return {str(q.get("qid")): q for q in questions}
+        stored = get(self.session_ns, "questions_by_qid")
+        if stored:
+            return stored
+        return {str(q.get("qid")): q for q in get(self.session_ns, "questions") or []}
+
+    def _grade_all(self, questions_by_qid: Dict[str, Dict[str, Any]], answers: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Grade every question, in order. Performs no memory writes.
+
+        MCQs are checked locally; blank free-form answers score zero without
+        grading, and the rest go to the grader tool in a single
+        grade_questions_batch call.
+        """
+        results, freeform = self._grade_local(questions_by_qid, answers)
+        if freeform:
+            self._apply_grades(results, freeform, self._grade_batch(freeform))
+        return results
+
+    async def _agrade_all(self, questions_by_qid: Dict[str, Dict[str, Any]], answers: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Async variant of _grade_all: free-form batches are graded concurrently in worker threads."""
+        results, freeform = self._grade_local(questions_by_qid, answers)
+        gate = asyncio.Semaphore(max(1, GRADER_CONCURRENCY))
+
+        async def one(batch):
+            async with gate:
+                grades = await asyncio.to_thread(self._grade_batch, batch)
+            self._apply_grades(results, batch, grades)
+
+        batches = [freeform[i:i + GRADER_BATCH_SIZE] for i in range(0, len(freeform), GRADER_BATCH_SIZE)]
+        await asyncio.gather(*(one(batch) for batch in batches))
+        return results
+
+    def _grade_local(self, questions_by_qid: Dict[str, Dict[str, Any]], answers: Dict[str, Any]):
+        """Grade MCQs and blank answers in place; return (results, free-form items still to grade)."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(questions_by_qid)
+        freeform = []  # (index, qid, question, expected, user_ans)
+        for i, (qid, q) in enumerate(questions_by_qid.items()):
+            expected, user_ans, is_mcq = self._parse_answer(qid, q, answers)
+            if is_mcq:
+                results[i] = self._grade_mcq(q, qid, expected, user_ans)
+            elif not user_ans:
+                results[i] = {"qid": qid, "prompt": q.get("prompt"), "expected": expected, "answer": "",
+                              "score": 0.0, "correct": False, "feedback": "No answer provided"}
             else:
-                # Fallback to old grader for non-MCQ
-                grade = grade_question({"expected": expected, "answer": user_ans, "mode": "mixed"})
-                score = grade["score"]
-                is_correct = grade["correct"]
-                feedback = grade["feedback"]
-
-            total += score
-            results.append({"qid": qid, "prompt": q.get("prompt"), "expected": expected, "answer": user_ans, "score": score, "correct": is_correct, "feedback": feedback})
-            append_event(self.session_ns, {"role":"user","type":"answer","content":{"qid":qid,"answer":user_ans}})
-            append_event(self.session_ns, {"role":"agent","type":"graded","content":{"qid":qid,"score":score,"correct":is_correct}})
+                freeform.append((i, qid, q, expected, user_ans))
+        return results, freeform
+
+    def _grade_batch(self, freeform: List[tuple]) -> List[Optional[Dict[str, Any]]]:
+        """One grade_questions_batch call for the given free-form items; None grades on failure."""
+        try:
+            return grade_questions_batch(
+                [{"expected": expected, "answer": user_ans, "mode": "mixed"} for _, _, _, expected, user_ans in freeform]
+            )
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Batch grading failed: %s", e)
+            return [None] * len(freeform)
+
+    def _apply_grades(self, results: List[Optional[Dict[str, Any]]], freeform: List[tuple], grades) -> None:
+        """Write the grades for free-form items back into their slots in results."""
+        for (i, qid, q, expected, user_ans), grade in zip(freeform, grades):
+            if grade is None:
+                results[i] = {"qid": qid, "prompt": q.get("prompt"), "expected": expected, "answer": user_ans,
+                              "score": 0.0, "correct": False, "feedback": "Could not grade this answer."}
+                continue
+            results[i] = {"qid": qid, "prompt": q.get("prompt"), "expected": expected, "answer": user_ans,
+                          "score": grade["score"], "correct": grade["correct"], "feedback": grade["feedback"]}
+
+    def _parse_answer(self, qid: str, q: Dict[str, Any], answers: Dict[str, Any]):
+        """Return (expected, normalized answer, is_mcq) for a question."""
+        expected = q.get("answer") or q.get("expected") # support both new and old format
+        
+        # Debug: Log lookup attempt (the key list copy is only built when DEBUG is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Looking up answer for QID: '%s' in answers keys: %s", qid, list(answers.keys()))
+        
+        user_ans_raw = answers.get(qid, "").strip()
+        is_mcq = bool(expected) and len(expected) == 1 and expected in "ABCD"
+        user_ans = user_ans_raw.upper()
+        if is_mcq:
+            # app.py sends "A) Text"; the leading letter is the choice ("A", "A)", "A." all work)
+            first = user_ans[:1]
+            if first and first in "ABCD":
+                user_ans = first
+        
+        # Debug Logging
+        logger.debug("Grading QID: %s | User Raw: '%s' | Parsed: '%s' | Expected: '%s'", qid, user_ans_raw, user_ans, expected)
+        return expected, user_ans, is_mcq
+
+    def _grade_mcq(self, q: Dict[str, Any], qid: str, expected: str, user_ans: str) -> Dict[str, Any]:
+        is_correct = user_ans == expected
+        score = 1.0 if is_correct else 0.0
+        feedback = "Correct!" if is_correct else q.get("explanation", "")
+        return {"qid": qid, "prompt": q.get("prompt"), "expected": expected, "answer": user_ans, "score": score, "correct": is_correct, "feedback": feedback}
+
+    def _finalize(self, results: List[Dict[str, Any]], topic: str) -> Dict[str, Any]:
+        """Record graded results in session memory and build the results payload."""
+        pending_events: List[Dict[str, Any]] = []
+        new_mistakes: List[Dict[str, Any]] = []
+        now_iso = datetime.utcnow().isoformat()  # one timestamp for the whole graded batch
+        for r in results:
+            qid, score, is_correct = r["qid"], r["score"], r["correct"]
+            pending_events.append({"role":"user","type":"answer","content":{"qid":qid,"answer":r["answer"]}})
+            pending_events.append({"role":"agent","type":"graded","content":{"qid":qid,"score":score,"correct":is_correct}})
             
             # MISTAKE BANK: Store weak areas
             if not is_correct:
-                mistake_entry = {
+                new_mistakes.append({
                     "topic": topic,
-                    "question": q.get("prompt"),
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                # Retrieve existing mistakes
-                current_mistakes = get(self.session_ns, "mistake_bank") or []
-                current_mistakes.append(mistake_entry)
-                put(self.session_ns, "mistake_bank", current_mistakes)
-                logger.info(f"Recorded mistake for topic '{topic}'")
-
-        avg = total / max(1, len(questions))
-        compacted = compact_session(self.session_ns, keep_last=10)
-        summary = ""
-        if isinstance(compacted, dict):
-            summary = (compacted.get("state") or {}).get("short_summary","")
+                    "question": r["prompt"],  # already looked up while grading
+                    "timestamp": now_iso
+                })
+
+        append_events(self.session_ns, pending_events)
+        if new_mistakes:
+            current_mistakes = get(self.session_ns, "mistake_bank") or []
+            put(self.session_ns, "mistake_bank", current_mistakes + new_mistakes)
+            logger.info(f"Recorded {len(new_mistakes)} mistake(s) for topic '{topic}'")
+
+        avg = sum(r["score"] for r in results) / max(1, len(results))
+        # Compact only every COMPACT_INTERVAL events; otherwise reuse the last summary
+        if needs_compact(self.session_ns, interval=COMPACT_INTERVAL):
+            compacted = compact_session(self.session_ns, keep_last=10)
+            state = compacted.get("state") if isinstance(compacted, dict) else None
+        else:
+            state = get(self.session_ns, "state")
+        summary = (state or {}).get("short_summary","")
         append_event(self.session_ns, {"role":"agent","type":"assessment_summary","content":{"avg_score":avg}})
-        return {"status":"ok","phase":"results","avg_score":avg,"results":results,"compacted_summary":summary}
\ No newline at end of file
+        return {"status":"ok","phase":"results","avg_score":avg,"results":results,"compacted_summary":summary}
@@ -12,8 +12,9 @@ class BaseAgent(abc.ABC):
     Base class for agents in the personalized_learning_coach project.
 
     Subclasses should implement `run` (synchronous) or `run_async` (asynchronous)
-    depending on usage. The default `run_async` will call `run` in a thread
-    pool so synchronous implementations remain compatible with async callers.
+    depending on usage. The default `run_async` prefers a coroutine `arun`
+    when the subclass defines one and otherwise returns `run`'s result, so
+    synchronous implementations remain compatible with async callers.
 
     Notes:
     - If a subclass implements `run` as an `async def` (i.e. returns a coroutine),
@@ -44,15 +45,19 @@ class BaseAgent(abc.ABC):
     async def run_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Optional asynchronous entrypoint. By default this will delegate to
-        `run` using an executor so existing synchronous subclasses work when
-        called from async code.
+        `arun` when available, or to `run`, so existing synchronous subclasses
+        work when called from async code.
 
         Behavior:
+         - If the subclass defines a coroutine `arun`, await it instead of `run`.
          - If `run` returns an awaitable/coroutine, await it directly.
-         - Otherwise, if an event loop is running, execute `run` in the default
-           executor to avoid blocking the loop.
-         - If no event loop is running, call `run` synchronously and return the result.
+         - Otherwise return the value `run` produced.
         """
+        # Prefer a native async implementation when the subclass provides one
+        arun = getattr(self, "arun", None)
+        if arun is not None and inspect.iscoroutinefunction(arun):
+            return await arun(payload)
+
         # Call run() directly — it might return a coroutine/awaitable
         try:
             result = self.run(payload)
@@ -73,20 +78,7 @@ class BaseAgent(abc.ABC):
                 logger.exception("Awaiting result from run() failed for %s", self)
                 raise
 
-        # Otherwise, result is a regular value; if we're already in a running loop,
-        # run the blocking call in the executor so we don't block the event loop.
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            # No running loop: return the sync result directly
-            return result  # type: ignore[return-value]
-
-        # We're inside an event loop — run the sync call in an executor.
-        logger.debug("Delegating to synchronous run() in executor for %s", self)
-        try:
-            return await loop.run_in_executor(None, lambda: result)
-        except asyncio.CancelledError:
-            raise
-        except Exception:
-            logger.exception("run_in_executor failed for %s", self)
-            raise
\ No newline at end of file
+        # Otherwise run() already produced the value; hand it back directly.
+        # Subclasses that need to offload blocking work should provide `arun`
+        # (e.g. wrapping asyncio.to_thread) instead.
+        return result  # type: ignore[return-value]
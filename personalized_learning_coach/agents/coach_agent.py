@@ -1,29 +1,67 @@
 # personalized_learning_coach/agents/coach_agent.py
-import json
-from typing import Dict, Any
+from typing import Any, Dict, Optional
+from personalized_learning_coach.utils import jsonfast
 from personalized_learning_coach.utils.llm_client import LLMClient
 from observability.logger import get_logger
 
 logger = get_logger("CoachAgent")
 
+SYSTEM_INSTRUCTION = "Motivation coach: return JSON with message and routine"
+FALLBACK_REPLY = {"message": "Keep going — small steps add up!", "routine": ["Study 10 minutes", "Review examples"]}
+
+# History lists in the progress context ("history" or "*_history" keys, at any depth)
+# are cut to their most recent CONTEXT_MAX_ITEMS entries; other fields are sent whole
+CONTEXT_MAX_ITEMS = 10
+
+
+def _is_history_key(key: Any) -> bool:
+    return isinstance(key, str) and (key == "history" or key.endswith("_history"))
+
+
+def _trim_histories(value: Any, max_items: int) -> Any:
+    """Copy of `value` with each history list shortened to its last `max_items` entries."""
+    if isinstance(value, dict):
+        return {
+            k: _trim_histories(v[-max_items:] if _is_history_key(k) and isinstance(v, (list, tuple)) else v, max_items)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_trim_histories(v, max_items) for v in value]
+    return value
+
 
 class CoachAgent:
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, llm_client: Optional[LLMClient] = None):
         self.user_id = user_id
-        self.llm = LLMClient()
+        self.llm = llm_client or LLMClient()
         self.logger = logger
 
-    def run(self, progress_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _prompt(self, progress_data: Dict[str, Any]) -> str:
         # Build prompt encouraging the student
-        prompt = f"Provide a brief motivational message and a 2-step study routine for this context: {json.dumps(progress_data)}"
+        context = jsonfast.dumps(_trim_histories(progress_data, CONTEXT_MAX_ITEMS), sort_keys=True)
+        return f"Provide a brief motivational message and a 2-step study routine for this context: {context}"
+
+    def _parse(self, resp: Any) -> Dict[str, Any]:
+        try:
+            # A dict means the LLM client already returned structured output
+            parsed = resp if isinstance(resp, dict) else jsonfast.loads(resp)
+            if isinstance(parsed, dict) and "message" in parsed:
+                return parsed
+        except Exception:
+            # fallback to using text as message
+            return {"message": resp, "routine": ["Study 15 minutes", "Do 5 example problems"]}
+
+    def run(self, progress_data: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            resp = self.llm.generate_content(self._prompt(progress_data), system_instruction=SYSTEM_INSTRUCTION)
+            return self._parse(resp)
+        except Exception:
+            return dict(FALLBACK_REPLY)
+
+    async def arun(self, progress_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of run() so callers can overlap it with other LLM calls."""
         try:
-            resp = self.llm.generate_content(prompt, system_instruction="Motivation coach: return JSON with message and routine")
-            try:
-                parsed = json.loads(resp)
-                if isinstance(parsed, dict) and "message" in parsed:
-                    return parsed
-            except Exception:
-                # fallback to using text as message
-                return {"message": resp, "routine": ["Study 15 minutes", "Do 5 example problems"]}
+            resp = await self.llm.agenerate_content(self._prompt(progress_data), system_instruction=SYSTEM_INSTRUCTION)
+            return self._parse(resp)
         except Exception:
-            return {"message": "Keep going — small steps add up!", "routine": ["Study 10 minutes", "Review examples"]}
\ No newline at end of file
+            return dict(FALLBACK_REPLY)
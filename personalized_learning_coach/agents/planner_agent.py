@@ -1,9 +1,12 @@
 # personalized_learning_coach/agents/planner_agent.py
-import json
+import hashlib
 import os
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
 
+from personalized_learning_coach.utils import jsonfast
+from personalized_learning_coach.utils.cache import LRUCache
 from personalized_learning_coach.utils.llm_client import LLMClient
 from personalized_learning_coach.memory.kv_store import put, get, append_event
 from observability.logger import get_logger
@@ -11,49 +14,138 @@ from observability.tracer import trace_agent
 
 logger = get_logger("PlannerAgent")
 
+# Generated plans are reused across users when PLC_PLAN_CACHE=1. Entries are stored
+# as templates with the topic replaced by TOPIC_PLACEHOLDER, in memory and in the KV store.
+# Template strings escape literal braces as "{{" / "}}", str.format style, so model text
+# that happens to contain the placeholder survives; v2 templates are the escaped ones.
+PLAN_CACHE_NS = "plan_cache:v2"
+TOPIC_PLACEHOLDER = "{topic}"
+_TEMPLATE_FIELD_RE = re.compile(r"\{\{|\}\}|" + re.escape(TOPIC_PLACEHOLDER))
+_PLAN_CACHE = LRUCache(maxsize=128)
+
+# Markdown fences the model sometimes wraps its JSON in
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*|\s*```")
+
+
+def _plan_cache_enabled() -> bool:
+    return os.environ.get("PLC_PLAN_CACHE", "0") not in ("0", "", "false", "False")
+
+
+def _plan_cache_key(topic: str, assessment_data: Any) -> str:
+    """Digest of the case/whitespace-normalized topic and the assessment context."""
+    norm = " ".join(str(topic).casefold().split())
+    context = jsonfast.dumpb(assessment_data, sort_keys=True) if assessment_data else b""
+    return hashlib.blake2b(norm.encode("utf-8") + b"\0" + context, digest_size=16).hexdigest()
+
+
+def _replace_in_strings(obj: Any, pattern: "re.Pattern[str]", repl: Callable[["re.Match[str]"], str]) -> Any:
+    if isinstance(obj, str):
+        return pattern.sub(repl, obj)
+    if isinstance(obj, list):
+        return [_replace_in_strings(v, pattern, repl) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _replace_in_strings(v, pattern, repl) for k, v in obj.items()}
+    return obj
+
+
+def _plan_template(plan: Dict[str, Any], topic: str) -> Dict[str, Any]:
+    """Copy of plan with whole-word occurrences of topic, as typed, replaced by the placeholder.
+
+    Only the requester's exact spelling is replaced; differently cased mentions are
+    the model's own wording for the same topic and are kept as written.
+    """
+    pattern = re.compile(r"(?<!\w)(" + re.escape(topic) + r")(?!\w)|[{}]")
+    return _replace_in_strings(plan, pattern, lambda m: TOPIC_PLACEHOLDER if m.group(1) else m.group(0) * 2)
+
+
+def _plan_from_template(template: Dict[str, Any], topic: str) -> Dict[str, Any]:
+    return _replace_in_strings(
+        template, _TEMPLATE_FIELD_RE, lambda m: topic if m.group(0) == TOPIC_PLACEHOLDER else m.group(0)[0]
+    )
+
 
 class PlannerAgent:
-    def __init__(self, user_id: str):
+    # Static part of the planning prompt; only the JSON context is appended per call
+    PROMPT_PREFIX = (
+        "You are a curriculum planner. Produce a 4-week learning plan for the topic provided.\n\n"
+        "Return a JSON object with 'weeks' (list of objects with keys: topic, goal, activities) and 'summary'.\n\n"
+        "Context:\n"
+    )
+
+    def __init__(self, user_id: str, llm_client: Optional[LLMClient] = None):
         self.user_id = user_id
         self.session_ns = f"session:{user_id}"
-        self.llm = LLMClient()
+        self._llm = llm_client
+
+    @property
+    def llm(self) -> LLMClient:
+        """The LLM client, created on first use when none was injected.
+
+        Cached-plan and fallback runs never touch it.
+        """
+        if self._llm is None:
+            self._llm = LLMClient()
+        return self._llm
 
     def _build_prompt(self, assessment_data: Dict[str, Any], topic: str) -> str:
         # Simple structured instruction for LLM to produce weeks list
         context = {"user_id": self.user_id, "topic": topic, "assessment": assessment_data}
-        return (
-            "You are a curriculum planner. Produce a 4-week learning plan for the topic provided.\n\n"
-            "Return a JSON object with 'weeks' (list of objects with keys: topic, goal, activities) and 'summary'.\n\n"
-            f"Context:\n{json.dumps(context)}"
-        )
+        return self.PROMPT_PREFIX + jsonfast.dumps(context, sort_keys=True)
 
-    def _safe_parse(self, text: str) -> Dict[str, Any]:
+    def _safe_parse(self, text: Any) -> Dict[str, Any]:
         if not text:
             return {}
+        if isinstance(text, dict):
+            # The LLM client already returned structured output
+            return text
         try:
-            return json.loads(text)
+            return jsonfast.loads(text)
         except Exception:
-            # try to find first JSON object inside text
-            start = text.find("{")
-            end = text.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    return json.loads(text[start:end+1])
-                except Exception:
-                    pass
+            # Decode the first complete object; later blobs and prose are ignored
+            plan = jsonfast.extract(_CODE_FENCE_RE.sub("", text), "{")
+            if plan is not None:
+                return plan
         return {}
 
+    def _cached_plan(self, cache_key: str, topic: str) -> Optional[Dict[str, Any]]:
+        template = _PLAN_CACHE.get(cache_key)
+        if template is None:
+            template = get(PLAN_CACHE_NS, cache_key)
+            if template is None:
+                return None
+            _PLAN_CACHE.put(cache_key, template)
+        logger.info("Plan cache hit", extra={"topic": topic})
+        return _plan_from_template(template, topic)
+
+    def _remember_plan(self, cache_key: str, plan: Dict[str, Any], topic: str) -> None:
+        template = _plan_template(plan, topic)
+        _PLAN_CACHE.put(cache_key, template)
+        try:
+            put(PLAN_CACHE_NS, cache_key, template)
+        except Exception:
+            logger.exception("Failed to persist plan template")
+
     def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if True: # Legacy tracer block
             requested = payload.get("request", "") if isinstance(payload, dict) else ""
             topic = payload.get("topic") or payload.get("request") or "General Topic"
-            prompt = self._build_prompt(payload, topic)
-            try:
-                resp = self.llm.generate_content(prompt, system_instruction="Curriculum planner - produce JSON plan")
-                plan = self._safe_parse(resp)
-            except Exception as e:
-                logger.exception("Planner LLM failed")
-                plan = {}
+            cache_key = None
+            plan = None
+            if _plan_cache_enabled():
+                cache_key = _plan_cache_key(topic, payload.get("assessment_data"))
+                plan = self._cached_plan(cache_key, topic.strip())
+
+            if plan is None:
+                prompt = self._build_prompt(payload, topic)
+                try:
+                    resp = self.llm.generate_content(prompt, system_instruction="Curriculum planner - produce JSON plan")
+                    plan = self._safe_parse(resp)
+                except Exception as e:
+                    logger.exception("Planner LLM failed")
+                    plan = {}
+                # Only plans the model actually produced are worth sharing
+                if cache_key and plan and "weeks" in plan:
+                    self._remember_plan(cache_key, plan, topic.strip())
 
             # If the model didn't produce weeks, create a reasonable fallback
             if not plan or "weeks" not in plan:
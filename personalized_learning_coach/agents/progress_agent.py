@@ -1,12 +1,63 @@
 # personalized_learning_coach/agents/progress_agent.py
 """Agent responsible for tracking user progress and skill mastery."""
-from typing import Dict, Any
-from datetime import datetime
+import base64
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from personalized_learning_coach.agents.progress_kernels import (
+    TREND_DECLINING, TREND_IMPROVING, TREND_STABLE, ema_update,
+)
 from personalized_learning_coach.memory.kv_store import get, put
+from personalized_learning_coach.utils.clock import utc_now_iso
 from observability.logger import get_logger
 
 logger = get_logger("ProgressAgent")
 
+# Skill profiles are stored column-wise:
+# {"schema": 2, "ids": [...], "mastery": base64(float32), "ts": [...]}
+PROFILES_KEY = "skill_profiles_soa"
+PROFILES_SCHEMA = 2
+# Older stores hold a list of {"skill_id", "mastery_score", "last_practiced"} dicts
+LEGACY_PROFILES_KEY = "skill_profiles"
+
+
+def _decode_profiles(raw: Any) -> Tuple[List[str], np.ndarray, List[str]]:
+    if isinstance(raw, dict):
+        ids = list(raw.get("ids") or [])
+        mastery = np.frombuffer(base64.b64decode(raw.get("mastery") or ""), dtype="<f4").copy()
+        ts = list(raw.get("ts") or [])
+        if len(ids) == len(mastery) == len(ts):
+            return ids, mastery, ts
+        logger.warning("Skill profile columns have mismatched lengths; starting fresh")
+        return [], np.zeros(0, dtype=np.float32), []
+    # Legacy list-of-dicts layout
+    profiles = [p for p in (raw or []) if isinstance(p, dict) and p.get("skill_id")]
+    ids = [p["skill_id"] for p in profiles]
+    mastery = np.array([float(p.get("mastery_score", 0.0)) for p in profiles], dtype=np.float32)
+    ts = [p.get("last_practiced", "") for p in profiles]
+    return ids, mastery, ts
+
+
+def _encode_profiles(ids: List[str], mastery: np.ndarray, ts: List[str]) -> Dict[str, Any]:
+    return {
+        "schema": PROFILES_SCHEMA,
+        "ids": ids,
+        "mastery": base64.b64encode(mastery.astype("<f4").tobytes()).decode("ascii"),
+        "ts": ts,
+    }
+
+
+def _clamp_score(raw_score: Any) -> float:
+    try:
+        score = float(raw_score)
+    except (ValueError, TypeError):
+        score = 0.0
+    return max(0.0, min(1.0, score))
+
+
+_TREND_NAMES = {TREND_IMPROVING: "improving", TREND_STABLE: "stable", TREND_DECLINING: "declining"}
+
 
 class ProgressAgent:
     """Tracks and updates user skill mastery."""
@@ -15,51 +66,88 @@ class ProgressAgent:
         self.alpha = float(alpha) if alpha and 0 < alpha <= 1 else 0.3
         self.logger = logger
 
-    def _now_iso(self) -> str:
-        return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    def _load_profiles(self) -> Tuple[List[str], np.ndarray, List[str]]:
+        namespace = f"user:{self.user_id}"
+        raw = get(namespace, PROFILES_KEY)
+        if raw is not None:
+            return _decode_profiles(raw)
+        columns = _decode_profiles(get(namespace, LEGACY_PROFILES_KEY))
+        if columns[0]:
+            # One-shot migration so the legacy list is never decoded again
+            try:
+                put(namespace, PROFILES_KEY, _encode_profiles(*columns))
+            except Exception: # pylint: disable=broad-exception-caught
+                logger.exception("Failed to migrate legacy skill profiles")
+        return columns
+
+    def get_skill_profiles(self) -> Dict[str, Dict[str, Any]]:
+        """Return {skill_id: {"mastery_score", "last_practiced"}} in first-practiced order."""
+        ids, mastery, ts = self._load_profiles()
+        return {
+            sid: {"mastery_score": float(m), "last_practiced": t}
+            for sid, m, t in zip(ids, mastery, ts)
+        }
 
     def run(self, lesson_results: Dict[str, Any]) -> Dict[str, Any]:
-        """Updates skill mastery based on lesson results."""
-        # lesson_results expected: {"skill_id":..., "score": float 0..1}
-        skill_id = lesson_results.get("skill_id")
-        raw_score = lesson_results.get("score", 0.0)
-        if not skill_id:
+        """Updates skill mastery based on lesson results.
+
+        Accepts a single {"skill_id", "score"} result, or {"results": [...]} for a
+        batch, in which case the per-skill summaries are returned under "results".
+        """
+        batch = lesson_results.get("results")
+        items = batch if isinstance(batch, list) else [lesson_results]
+        skill_ids = [item.get("skill_id") if isinstance(item, dict) else None for item in items]
+        if not skill_ids or not all(skill_ids):
             return {"error": "missing skill_id"}
+        scores = np.array([_clamp_score(item.get("score", 0.0)) for item in items], dtype=np.float32)
+
+        ids, mastery, ts = self._load_profiles()
+        index = {sid: i for i, sid in enumerate(ids)}
+        now = utc_now_iso(fraction=False)
+
+        # Unknown skills get a row here; their first score is taken as-is (alpha 1)
+        fresh = [sid for sid in dict.fromkeys(skill_ids) if sid not in index]
+        for sid in fresh:
+            index[sid] = len(ids)
+            ids.append(sid)
+            ts.append(now)
+        if fresh:
+            mastery = np.concatenate([mastery, np.zeros(len(fresh), dtype=np.float32)])
+        rows = np.array([index[sid] for sid in skill_ids], dtype=np.intp)
+
+        # Occurrence number of each result per skill, so repeats within a batch compound in order
+        seen: Dict[str, int] = {}
+        rank = np.empty(len(skill_ids), dtype=np.intp)
+        for pos, sid in enumerate(skill_ids):
+            rank[pos] = seen[sid] = seen.get(sid, -1) + 1
+        alphas = np.full(len(skill_ids), self.alpha, dtype=np.float32)
+        alphas[(rank == 0) & (rows >= len(ids) - len(fresh))] = 1.0
+
+        new = np.empty_like(scores)
+        delta = np.empty_like(scores)
+        trend = np.empty(len(skill_ids), dtype=np.int8)
+        for r in range(int(rank.max()) + 1):
+            sel = np.flatnonzero(rank == r)
+            idx = rows[sel]
+            new[sel], delta[sel], trend[sel] = ema_update(mastery[idx], scores[sel], alphas[sel])
+            mastery[idx] = new[sel]
+        for row in set(rows.tolist()):
+            ts[row] = now
+
         try:
-            score = float(raw_score)
-        except (ValueError, TypeError):
-            score = 0.0
-        score = max(0.0, min(1.0, score))
-        profiles = get(f"user:{self.user_id}", "skill_profiles") or []
-        found = None
-        for p in profiles:
-            if p.get("skill_id") == skill_id:
-                found = p
-                break
-        now = self._now_iso()
-        if found:
-            prev = float(found.get("mastery_score", 0.0))
-            new = prev * (1 - self.alpha) + score * self.alpha
-            delta = new - prev
-            found["mastery_score"] = new
-            found["last_practiced"] = now
-        else:
-            new = score
-            delta = new
-            entry = {"skill_id": skill_id, "mastery_score": new, "last_practiced": now}
-            profiles.append(entry)
-        try:
-            put(f"user:{self.user_id}", "skill_profiles", profiles)
+            put(f"user:{self.user_id}", PROFILES_KEY, _encode_profiles(ids, mastery, ts))
         except Exception: # pylint: disable=broad-exception-caught
             logger.exception("Failed to persist profile")
-        trend = "stable"
-        if delta > 0.01:
-            trend = "improving"
-        elif delta < -0.01:
-            trend = "declining"
-        return {
-            "skill_id": skill_id,
-            "new_mastery": round(new, 3),
-            "delta": round(delta, 3),
-            "trend_summary": trend
-        }
\ No newline at end of file
+
+        summaries = [
+            {
+                "skill_id": sid,
+                "new_mastery": round(float(n), 3),
+                "delta": round(float(d), 3),
+                "trend_summary": _TREND_NAMES[int(t)],
+            }
+            for sid, n, d, t in zip(skill_ids, new, delta, trend)
+        ]
+        if isinstance(batch, list):
+            return {"results": summaries}
+        return summaries[0]
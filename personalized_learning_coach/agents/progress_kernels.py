@@ -0,0 +1,53 @@
+# personalized_learning_coach/agents/progress_kernels.py
+"""Mastery update kernels for ProgressAgent, compiled with numba when it is installed."""
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - optional speedup
+    njit = None
+
+# Mastery changes smaller than this either way count as "stable"
+TREND_THRESHOLD = 0.01
+
+TREND_IMPROVING = 1
+TREND_STABLE = 0
+TREND_DECLINING = -1
+
+
+def _ema_update_numpy(prev: np.ndarray, score: np.ndarray, alpha: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    new = prev * (1 - alpha) + score * alpha
+    delta = new - prev
+    trend = np.where(delta > TREND_THRESHOLD, TREND_IMPROVING,
+                     np.where(delta < -TREND_THRESHOLD, TREND_DECLINING, TREND_STABLE)).astype(np.int8)
+    return new, delta, trend
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _ema_update_jit(prev, score, alpha):  # pragma: no cover - needs numba
+        n = prev.shape[0]
+        new = np.empty_like(prev)
+        delta = np.empty_like(prev)
+        trend = np.zeros(n, dtype=np.int8)
+        for i in range(n):
+            new[i] = prev[i] * (1 - alpha[i]) + score[i] * alpha[i]
+            delta[i] = new[i] - prev[i]
+            if delta[i] > TREND_THRESHOLD:
+                trend[i] = TREND_IMPROVING
+            elif delta[i] < -TREND_THRESHOLD:
+                trend[i] = TREND_DECLINING
+        return new, delta, trend
+
+
+def ema_update(prev: np.ndarray, score: np.ndarray, alpha: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Blend scores into previous mastery element-wise.
+
+    Returns (new_mastery, delta, trend) where trend holds TREND_* codes as int8.
+    All inputs are 1-D arrays of the same length.
+    """
+    if njit is not None:
+        return _ema_update_jit(prev, score, alpha)
+    return _ema_update_numpy(prev, score, alpha)
@@ -1,102 +1,253 @@
 # personalized_learning_coach/agents/tutor_agent.py
-import json
+import asyncio
+import copy
+import io
 import os
-from typing import Dict, Any, Optional
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
 
-from personalized_learning_coach.utils.llm_client import LLMClient
+from personalized_learning_coach.utils.cache import LRUCache
+from personalized_learning_coach.utils.llm_client import MAX_CONCURRENT_REQUESTS, LLMClient
 from observability.logger import get_logger
 from observability.tracer import trace_agent
 
 logger = get_logger("TutorAgent")
 
+# Background workers for lessons generated ahead of the turn that asks for them
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lesson-prefetch")
+# Longest run() waits on a prefetched lesson before generating it itself
+PREFETCH_WAIT_SECONDS = 30
+
+# Parsed lessons per (topic, model); the prompt depends only on the topic, so
+# every user reaching the same plan week reuses one generation
+LESSON_CACHE_TTL = 6 * 3600
+_LESSON_CACHE = LRUCache(maxsize=256, ttl=LESSON_CACHE_TTL)
+_TOPIC_SPACE_RE = re.compile(r"\s+")
+
+
+def _lesson_key(topic: str, model: str) -> Tuple[str, str]:
+    """Cache key that ignores case, runs of whitespace and trailing "?!." in the topic.
+
+    "python  loops?" shares the lesson for "Python Loops"; symbols are kept, so
+    "C", "C++" and "C#" each get their own.
+    """
+    return _TOPIC_SPACE_RE.sub(" ", topic.casefold()).strip().rstrip("?!.").rstrip() or topic, model
+
+# One lesson of a batched reply: <<<LESSON i>>> ... <<<END i>>>
+_BATCH_SECTION_RE = re.compile(r"<<<LESSON (\d+)>>>(.*?)<<<END \1>>>", re.DOTALL)
+_FALLBACK_OVERVIEW = "Short lesson summary: enable Gemini for richer content. (Mock LLM) "
+# A markdown header naming one of the lesson sections, e.g. "## Worked Example"
+_SECTION_HEADER_RE = re.compile(r"\s*#.*?(overview|worked example|practice problems)", re.IGNORECASE)
+# Practice problems are the numbered or bulleted lines of their section
+_PROBLEM_LINE_RE = re.compile(r"\s*[\d-]")
+
+
+def _parse_lesson(resp_text: str) -> Tuple[Dict[str, Any], bool]:
+    """Split a markdown lesson into its sections.
+
+    Returns (lesson_content, cacheable); cacheable is False when no section
+    headers were found and the raw text (or a rate-limit notice) is used instead.
+    """
+    # Single pass: header lines switch the open section, body lines go straight to its buffer
+    text_sections = {"overview": io.StringIO(), "worked example": io.StringIO()}
+    problems_lines = []
+    section = None
+    buf = None
+
+    for line in resp_text.splitlines():
+        m = _SECTION_HEADER_RE.match(line)
+        if m:
+            section = m.group(1).lower()
+            buf = text_sections.get(section)
+            continue
+        if buf is not None:
+            buf.write(line)
+            buf.write("\n")
+        elif section == "practice problems" and _PROBLEM_LINE_RE.match(line):
+            problems_lines.append(line.strip())
+
+    lesson_content = {
+        "overview": text_sections["overview"].getvalue().strip(),
+        "worked_example": text_sections["worked example"].getvalue().strip(),
+        "practice_problems": problems_lines,
+    }
+    cacheable = bool(lesson_content["overview"] or lesson_content["worked_example"])
+
+    # Fallback: If overview is empty, use the whole text (parsing failed)
+    if not cacheable:
+        # Check if it's an error message
+        if "Gemini generate raised error" in resp_text:
+            lesson_content["overview"] = "I'm currently experiencing high traffic (Rate Limit Exceeded). Please wait a moment and try again."
+        else:
+            lesson_content["overview"] = resp_text
+    return lesson_content, cacheable
+
 
 class TutorAgent:
-    def __init__(self, user_id: str):
+    # Format instructions shared by every lesson prompt, sent as the system instruction so the
+    # provider can cache them; only the user prompt names the topic
+    PROMPT_BODY = (
+        "The lesson MUST be detailed enough for a beginner to understand and solve the practice problems without external resources.\n"
+        "Include syntax rules, key concepts, common pitfalls, and usage examples in the overview.\n\n"
+        "Return the lesson in the following MARKDOWN format:\n\n"
+        "## Overview\n"
+        "[Detailed overview text...]\n\n"
+        "## Worked Example\n"
+        "[Explanation text...]\n"
+        "```[language]\n"
+        "[Code snippet]\n"
+        "```\n\n"
+        "## Practice Problems\n"
+        "1. [Question text] (Difficulty: [Level])\n"
+        "2. ...\n"
+    )
+
+    def __init__(self, user_id: str, llm_client: Optional[LLMClient] = None):
         self.user_id = user_id
-        self.llm = LLMClient()
+        self.llm = llm_client or LLMClient()
         self.logger = logger
+        self._prefetched: Dict[str, Future] = {}  # {topic: lesson being generated}
 
     def _build_prompt(self, lesson_request: Dict[str, Any]) -> str:
         topic = lesson_request.get("topic", "General Topic")
-        return (
-            f"Act as an expert tutor. Create a comprehensive and detailed lesson for '{topic}'.\n"
-            "The lesson MUST be detailed enough for a beginner to understand and solve the practice problems without external resources.\n"
-            "Include syntax rules, key concepts, common pitfalls, and usage examples in the overview.\n\n"
-            "Return the lesson in the following MARKDOWN format:\n\n"
-            "## Overview\n"
-            "[Detailed overview text...]\n\n"
-            "## Worked Example\n"
-            "[Explanation text...]\n"
-            "```[language]\n"
-            "[Code snippet]\n"
-            "```\n\n"
-            "## Practice Problems\n"
-            "1. [Question text] (Difficulty: [Level])\n"
-            "2. ...\n"
-        )
+        return f"Act as an expert tutor. Create a comprehensive and detailed lesson for '{topic}'."
+
+    def prefetch(self, topic: str) -> None:
+        """Start generating the lesson for topic in the background; run() picks it up."""
+        if not topic or topic in self._prefetched or _LESSON_CACHE.get(_lesson_key(topic, self.llm.model)) is not None:
+            return
+        self._prefetched[topic] = _PREFETCH_POOL.submit(self._generate, topic)
+
+    def discard_prefetched(self, keep: Optional[str] = None) -> None:
+        """Drop speculative lessons for topics other than `keep`; queued ones are cancelled."""
+        for topic in [t for t in self._prefetched if t != keep]:
+            self._prefetched.pop(topic).cancel()
+
+    def _cached_lesson(self, topic: str) -> Optional[Dict[str, Any]]:
+        cached = _LESSON_CACHE.get(_lesson_key(topic, self.llm.model))
+        if cached is None:
+            return None
+        self._prefetched.pop(topic, None)
+        lesson = copy.deepcopy(cached)
+        lesson["topic"] = topic
+        return lesson
 
     def run(self, lesson_item: Dict[str, Any]) -> Dict[str, Any]:
         topic = lesson_item.get("topic", "General Topic") if isinstance(lesson_item, dict) else "General Topic"
         self.logger.info("TutorAgent run", extra={"topic": topic})
+        lesson = self._cached_lesson(topic)
+        if lesson is not None:
+            return lesson
+        pending = self._prefetched.pop(topic, None)
+        if pending is not None:
+            try:
+                return pending.result(timeout=PREFETCH_WAIT_SECONDS)
+            except Exception:
+                logger.exception("Prefetched lesson failed or timed out; generating again")
+        return self._generate(topic)
+
+    async def arun(self, lesson_item: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of run() so lessons for many students can be generated concurrently."""
+        topic = lesson_item.get("topic", "General Topic") if isinstance(lesson_item, dict) else "General Topic"
+        self.logger.info("TutorAgent run", extra={"topic": topic})
+        lesson = self._cached_lesson(topic)
+        if lesson is not None:
+            return lesson
+        pending = self._prefetched.pop(topic, None)
+        if pending is not None:
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(pending), PREFETCH_WAIT_SECONDS)
+            except Exception:
+                logger.exception("Prefetched lesson failed or timed out; generating again")
+        return await self._agenerate(topic)
+
+    async def arun_many(self, lesson_items: List[Dict[str, Any]], concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[Dict[str, Any]]:
+        """Lessons for several topics, in input order, with at most `concurrency` LLM calls in flight.
+
+        Unlike run_batch() each topic is its own request, so one slow or
+        malformed lesson does not hold up the others.
+        """
+        gate = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(topic: str) -> Dict[str, Any]:
+            async with gate:
+                return await self.arun({"topic": topic})
+
+        topics = [
+            item.get("topic", "General Topic") if isinstance(item, dict) else "General Topic"
+            for item in lesson_items
+        ]
+        unique = list(dict.fromkeys(topics))
+        lessons = dict(zip(unique, await asyncio.gather(*(one(topic) for topic in unique))))
+        return [lessons[topic] for topic in topics]
+
+    def _generate(self, topic: str) -> Dict[str, Any]:
         prompt = self._build_prompt({"topic": topic})
-        
-        lesson_content = {
-            "overview": "",
-            "worked_example": "",
-            "practice_problems": []
-        }
+        try:
+            resp_text = self.llm.generate_content(prompt, system_instruction=self.PROMPT_BODY)
+        except Exception:
+            logger.exception("Tutor LLM failed")
+            return self._lesson(topic, {"overview": _FALLBACK_OVERVIEW}, False)
+        return self._lesson(topic, *_parse_lesson(resp_text))
 
+    async def _agenerate(self, topic: str) -> Dict[str, Any]:
+        prompt = self._build_prompt({"topic": topic})
         try:
-            resp_text = self.llm.generate_content(prompt, system_instruction=f"Tutor for {topic}")
-            
-            # Parse Markdown Sections
-            current_section = None
-            lines = resp_text.splitlines()
-            
-            overview_lines = []
-            example_lines = []
-            problems_lines = []
-
-            for line in lines:
-                stripped = line.strip()
-                lower_line = stripped.lower()
-                
-                # Flexible Header Detection
-                if lower_line.startswith("#") and "overview" in lower_line:
-                    current_section = "overview"
-                    continue
-                elif lower_line.startswith("#") and "worked example" in lower_line:
-                    current_section = "example"
-                    continue
-                elif lower_line.startswith("#") and "practice problems" in lower_line:
-                    current_section = "problems"
-                    continue
-                
-                if current_section == "overview":
-                    overview_lines.append(line)
-                elif current_section == "example":
-                    example_lines.append(line)
-                elif current_section == "problems":
-                    if stripped and (stripped[0].isdigit() or stripped.startswith("-")):
-                        problems_lines.append(stripped)
-
-            lesson_content["overview"] = "\n".join(overview_lines).strip()
-            lesson_content["worked_example"] = "\n".join(example_lines).strip()
-            lesson_content["practice_problems"] = problems_lines
-            
-            # Fallback: If overview is empty, use the whole text (parsing failed)
-            if not lesson_content["overview"] and not lesson_content["worked_example"]:
-                 # Check if it's an error message
-                 if "Gemini generate raised error" in resp_text:
-                     lesson_content["overview"] = "I'm currently experiencing high traffic (Rate Limit Exceeded). Please wait a moment and try again."
-                 else:
-                     lesson_content["overview"] = resp_text
-
-        except Exception as e:
+            resp_text = await self.llm.agenerate_content(prompt, system_instruction=self.PROMPT_BODY)
+        except Exception:
             logger.exception("Tutor LLM failed")
-            lesson_content = {"overview": "Short lesson summary: enable Gemini for richer content. (Mock LLM) "}
+            return self._lesson(topic, {"overview": _FALLBACK_OVERVIEW}, False)
+        return self._lesson(topic, *_parse_lesson(resp_text))
 
-        return {"lesson_content": lesson_content, "generated_at": datetime.now(timezone.utc).isoformat(), "topic": topic}
+    def run_batch(self, lesson_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Lessons for several topics, in input order, generated with one LLM call where possible.
+
+        Cached and prefetched topics are served as in run(); a topic the model
+        skipped in the batched reply is generated on its own.
+        """
+        topics = [
+            item.get("topic", "General Topic") if isinstance(item, dict) else "General Topic"
+            for item in lesson_items
+        ]
+        lessons: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for topic in dict.fromkeys(topics):
+            if topic in self._prefetched or _LESSON_CACHE.get(_lesson_key(topic, self.llm.model)) is not None:
+                lessons[topic] = self.run({"topic": topic})
+            else:
+                missing.append(topic)
+        if len(missing) == 1:
+            lessons[missing[0]] = self._generate(missing[0])
+        elif missing:
+            lessons.update(self._generate_batch(missing))
+        return [lessons[topic] for topic in topics]
+
+    def _generate_batch(self, topics: List[str]) -> Dict[str, Dict[str, Any]]:
+        listing = "\n".join(f"{i}. '{topic}'" for i, topic in enumerate(topics, 1))
+        prompt = (
+            f"Act as an expert tutor. Create a comprehensive and detailed lesson for each of these {len(topics)} topics:\n"
+            f"{listing}\n\n"
+            "Write each lesson between a line <<<LESSON i>>> and a line <<<END i>>>, where i is the topic's number."
+        )
+        try:
+            resp_text = self.llm.generate_content(prompt, system_instruction=self.PROMPT_BODY)
+        except Exception:
+            logger.exception("Batched tutor LLM call failed")
+            resp_text = ""
+        sections = {int(m.group(1)): m.group(2) for m in _BATCH_SECTION_RE.finditer(resp_text or "")}
+        if not sections:
+            logger.warning("Batched lesson reply had no lesson markers; generating %d lessons one by one", len(topics))
+        lessons = {}
+        for i, topic in enumerate(topics, 1):
+            text = sections.get(i)
+            lessons[topic] = self._lesson(topic, *_parse_lesson(text)) if text else self._generate(topic)
+        return lessons
 
-        return {"lesson_content": lesson_content, "generated_at": datetime.now(timezone.utc).isoformat(), "topic": topic}
\ No newline at end of file
+    def _lesson(self, topic: str, lesson_content: Dict[str, Any], cacheable: bool) -> Dict[str, Any]:
+        lesson = {"lesson_content": lesson_content, "generated_at": datetime.now(timezone.utc).isoformat(), "topic": topic}
+        # Only real, parsed lessons are shared; fallbacks and error text are retried next time
+        if cacheable:
+            _LESSON_CACHE.put(_lesson_key(topic, self.llm.model), copy.deepcopy(lesson))
+        return lesson
@@ -1,12 +1,24 @@
-import json
+import asyncio
+import copy
+import hashlib
 import logging
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
-from personalized_learning_coach.utils.llm_client import LLMClient
+from personalized_learning_coach.utils import jsonfast
+from personalized_learning_coach.utils.cache import LRUCache
+from personalized_learning_coach.utils.llm_client import MAX_CONCURRENT_REQUESTS, LLMClient
 
 logger = logging.getLogger(__name__)
 
+_FENCED_JSON_RE = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+_FENCED_ANY_RE = re.compile(r"```\s*(\{.*?\})\s*```", re.DOTALL)
+
+# Verdicts per (model, digest of input/response/criteria); eval runs re-judge the
+# same cases, and only verdicts parsed from a real reply are kept
+VERDICT_CACHE_TTL = 24 * 3600
+_VERDICT_CACHE = LRUCache(maxsize=4096, ttl=VERDICT_CACHE_TTL)
+
 
 class LLMJudge:
     """
@@ -19,10 +31,9 @@ class LLMJudge:
     - Clear logging on errors and fallback return structure so callers always receive a predictable dict.
     """
 
-    def __init__(self, llm_client: Optional[LLMClient] = None):
-        self.llm = llm_client or LLMClient()
-        self.system_prompt = (
-            """
+    # Sent unchanged as the system instruction of every evaluation
+    SYSTEM_PROMPT = (
+        """
 You are an impartial AI Judge. Your job is to evaluate the quality of an AI Agent's response.
 
 You will be given:
@@ -40,44 +51,31 @@ Return ONLY a JSON object (no surrounding text). The JSON must include at least:
 - "rationale": a short explanation of the score
 Optionally you may add a "details" field with more structured information.
             """
-        )
+    )
 
-    def _extract_json(self, text: Optional[str]) -> Optional[str]:
-        """Try to extract a JSON object from arbitrary LLM output.
+    def __init__(self, llm_client: Optional[LLMClient] = None):
+        self.llm = llm_client or LLMClient()
+
+    def _extract_json(self, text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Try to extract and parse a JSON object from arbitrary LLM output.
 
         Strategies:
         - Look for fenced ```json ... ``` blocks
         - Look for fenced ``` ... ``` blocks
-        - Look for the first top-level {...} JSON object via a balanced-brace scan
+        - Decode the first top-level {...} object that parses, scanning from each "{"
         """
         if not text:
             return None
 
-        # 1) fenced json block
-        m = re.search(r"```json\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-        if m:
-            return m.group(1).strip()
-
-        # 2) any fenced block
-        m = re.search(r"```\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-        if m:
-            return m.group(1).strip()
-
-        # 3) first standalone JSON object (attempt balanced brace scan)
-        brace_start = text.find('{')
-        if brace_start == -1:
-            return None
+        for fence in (_FENCED_JSON_RE, _FENCED_ANY_RE):
+            m = fence.search(text)
+            if m:
+                try:
+                    return jsonfast.loads(m.group(1))
+                except jsonfast.JSONDecodeError:
+                    pass
 
-        depth = 0
-        for i in range(brace_start, len(text)):
-            if text[i] == '{':
-                depth += 1
-            elif text[i] == '}':
-                depth -= 1
-                if depth == 0:
-                    candidate = text[brace_start : i + 1]
-                    return candidate.strip()
-        return None
+        return jsonfast.extract(text, "{")
 
     def _validate_and_normalize(self, parsed: Dict[str, Any]) -> Dict[str, Any]:
         """Ensure returned structure contains `score` (1-5) and `rationale`.
@@ -120,60 +118,176 @@ Optionally you may add a "details" field with more structured information.
 
         return out
 
+    def _verdict_key(self, user_input: str, agent_response: str, expected_criteria: str) -> Tuple[str, str]:
+        raw = "\0".join((str(user_input), str(agent_response), str(expected_criteria)))
+        return getattr(self.llm, "model", ""), hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
     def evaluate(self, user_input: str, agent_response: str, expected_criteria: str) -> Dict[str, Any]:
         """
         Evaluates a single interaction.
 
         Returns a dict with at least keys: score (int 1..5) and rationale (str).
         """
-        prompt = (
+        key = self._verdict_key(user_input, agent_response, expected_criteria)
+        cached = _VERDICT_CACHE.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        verdict, ok = self._evaluate_uncached(user_input, agent_response, expected_criteria)
+        if ok:
+            _VERDICT_CACHE.put(key, copy.deepcopy(verdict))
+        return verdict
+
+    @staticmethod
+    def _prompt(user_input: str, agent_response: str, expected_criteria: str) -> str:
+        return (
             f"User Input: {user_input}\n\n"
             f"Agent Response: {agent_response}\n\n"
             f"Expected Criteria: {expected_criteria}\n\n"
             "Evaluate now and return ONLY the JSON object as described in the system instruction."
         )
 
-        response_text = ""
+    @staticmethod
+    def _failed(e: Exception) -> Dict[str, Any]:
+        logger.exception("LLMJudge evaluation failed: %s", exc_info=e)
+        return {
+            "score": 3,
+            "rationale": f"Evaluation failed: {str(e)}",
+        }
+
+    def _evaluate_uncached(self, user_input: str, agent_response: str, expected_criteria: str) -> Tuple[Dict[str, Any], bool]:
+        """Returns (verdict, ok); ok is False for the fallback verdicts of a failed evaluation."""
         try:
-            raw = self.llm.generate_content(prompt, system_instruction=self.system_prompt)
+            raw = self.llm.generate_content(
+                self._prompt(user_input, agent_response, expected_criteria), system_instruction=self.SYSTEM_PROMPT
+            )
+        except Exception as e:
+            return self._failed(e), False
+        return self._verdict(raw)
 
-            # Normalize raw to string for parsing heuristics (LLM client may return dict)
+    async def _aevaluate_uncached(self, user_input: str, agent_response: str, expected_criteria: str) -> Tuple[Dict[str, Any], bool]:
+        try:
+            raw = await self.llm.agenerate_content(
+                self._prompt(user_input, agent_response, expected_criteria), system_instruction=self.SYSTEM_PROMPT
+            )
+        except Exception as e:
+            return self._failed(e), False
+        return self._verdict(raw)
+
+    def _verdict(self, raw: Any) -> Tuple[Dict[str, Any], bool]:
+        """Parse one LLM reply into (verdict, ok)."""
+        response_text = ""
+        try:
             if isinstance(raw, dict):
-                # Pretty-print to stable JSON text
-                response_text = json.dumps(raw, ensure_ascii=False)
-            elif isinstance(raw, str):
-                response_text = raw
-            else:
-                # Fallback coercion
-                response_text = str(raw)
+                # The LLM client already returned structured output
+                return self._validate_and_normalize(raw), True
+            # Normalize raw to string for parsing heuristics
+            response_text = raw if isinstance(raw, str) else str(raw)
 
             logger.debug("LLM judge raw output: %s", response_text)
 
-            json_text = self._extract_json(response_text)
-            if not json_text:
-                # If we couldn't locate a JSON chunk, try to parse the whole response as JSON
+            parsed = self._extract_json(response_text)
+            if parsed is None:
+                # If we couldn't locate a JSON object, try to parse the whole response as JSON
                 try:
-                    parsed_whole = json.loads(response_text)
-                    if isinstance(parsed_whole, dict):
-                        normalized = self._validate_and_normalize(parsed_whole)
-                        return normalized
-                    # else fallthrough to raising below
-                except Exception:
+                    parsed = jsonfast.loads(response_text)
+                except jsonfast.JSONDecodeError:
+                    if "{" in response_text:
+                        raise  # looks like JSON but does not parse
+                    raise ValueError("Could not locate JSON object in LLM output")
+                if not isinstance(parsed, dict):
                     raise ValueError("Could not locate JSON object in LLM output")
 
-            parsed = json.loads(json_text)
-            normalized = self._validate_and_normalize(parsed)
-            return normalized
+            return self._validate_and_normalize(parsed), True
 
-        except json.JSONDecodeError:
+        except jsonfast.JSONDecodeError:
             logger.exception("JSON parsing failed for LLM judge output")
             return {
                 "score": 3,
                 "rationale": f"LLM returned invalid JSON. Raw output: {response_text[:500]}",
-            }
+            }, False
         except Exception as e:
-            logger.exception("LLMJudge evaluation failed: %s", exc_info=e)
-            return {
-                "score": 3,
-                "rationale": f"Evaluation failed: {str(e)}",
-            }
\ No newline at end of file
+            return self._failed(e), False
+
+    async def aevaluate(self, user_input: str, agent_response: str, expected_criteria: str) -> Dict[str, Any]:
+        """Async variant of evaluate() so callers can overlap several evaluations."""
+        key = self._verdict_key(user_input, agent_response, expected_criteria)
+        cached = _VERDICT_CACHE.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        verdict, ok = await self._aevaluate_uncached(user_input, agent_response, expected_criteria)
+        if ok:
+            _VERDICT_CACHE.put(key, copy.deepcopy(verdict))
+        return verdict
+
+    async def evaluate_many(self, items: List[Dict[str, str]], concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[Dict[str, Any]]:
+        """
+        Evaluates items with one request each, keeping at most `concurrency` in flight.
+
+        Results are returned in input order. Sync callers can use
+        asyncio.run(judge.evaluate_many(items)).
+        """
+        gate = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(item: Dict[str, str]) -> Dict[str, Any]:
+            async with gate:
+                return await self.aevaluate(*self._item_args(item))
+
+        return list(await asyncio.gather(*(one(item) for item in items)))
+
+    def evaluate_batch(self, items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Evaluates several interactions with a single LLM call.
+
+        Each item carries user_input, agent_response and expected_criteria. Returns one
+        result per item, in order; when the reply is not a JSON array with one object
+        per case, every item is evaluated on its own instead.
+        """
+        keys = [self._verdict_key(*self._item_args(item)) for item in items]
+        results: List[Optional[Dict[str, Any]]] = [_VERDICT_CACHE.get(key) for key in keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        for i, cached in enumerate(results):
+            if cached is not None:
+                results[i] = copy.deepcopy(cached)
+        for i, verdict in zip(pending, self._evaluate_misses([items[i] for i in pending])):
+            results[i] = verdict
+        return results  # type: ignore[return-value]
+
+    def _evaluate_misses(self, items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        if len(items) <= 1:
+            return [self._evaluate_item(item) for item in items]
+
+        cases = "\n\n".join(
+            f"### Case {i}\n"
+            f"User Input: {item.get('user_input', '')}\n\n"
+            f"Agent Response: {item.get('agent_response', '')}\n\n"
+            f"Expected Criteria: {item.get('expected_criteria', '')}"
+            for i, item in enumerate(items, 1)
+        )
+        prompt = (
+            f"{cases}\n\n"
+            f"Evaluate each of the {len(items)} cases independently and return ONLY a JSON array "
+            "with one object per case, in case order, each shaped as described in the system instruction."
+        )
+
+        parsed: Any = None
+        try:
+            raw = self.llm.generate_content(prompt, system_instruction=self.SYSTEM_PROMPT)
+            parsed = raw if isinstance(raw, list) else jsonfast.extract(str(raw), "[")
+        except Exception:
+            logger.exception("Batched LLM judge call failed")
+
+        if isinstance(parsed, list) and len(parsed) == len(items) and all(isinstance(p, dict) for p in parsed):
+            verdicts = [self._validate_and_normalize(p) for p in parsed]
+            for item, verdict in zip(items, verdicts):
+                _VERDICT_CACHE.put(self._verdict_key(*self._item_args(item)), copy.deepcopy(verdict))
+            return verdicts
+        logger.warning("Batched judge reply unusable; evaluating %d cases one by one", len(items))
+        return [self._evaluate_item(item) for item in items]
+
+    @staticmethod
+    def _item_args(item: Dict[str, str]) -> Tuple[str, str, str]:
+        return item.get("user_input", ""), item.get("agent_response", ""), item.get("expected_criteria", "")
+
+    def _evaluate_item(self, item: Dict[str, str]) -> Dict[str, Any]:
+        return self.evaluate(*self._item_args(item))
+
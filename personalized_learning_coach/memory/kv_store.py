@@ -1,119 +1,425 @@
 # personalized_learning_coach/memory/kv_store.py
 """Simple Key-Value Store for persistence."""
-import json
+import hashlib
+import os
+import re
+import shutil
+import sys
 import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from threading import Lock
-from datetime import datetime
-from typing import Any, Dict, Optional
+from threading import RLock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process locking only
+    fcntl = None
+
+from personalized_learning_coach.utils import jsonfast
+from personalized_learning_coach.utils.clock import utc_now_iso
 
 BASE = Path(__file__).parent
+# Pre-sharding single-file store; still read for namespaces without a shard, never written
 STORE_FILE = BASE / "store.json"
-_lock = Lock()
-
-def _now_iso():
-    return datetime.utcnow().isoformat() + "Z"
+# One JSON file per namespace, so a write only reserializes the namespace it touches
+SHARDS_DIR = BASE / "ns"
+CHATS_DIR = BASE / "chats"
+# Serializes threads of this process; writes also take an flock on <shard>.lock so
+# several worker processes can share the store
+_lock = RLock()
+# namespace -> its data (None when it does not exist), filled lazily from the shards
+_shards: Dict[str, Optional[Dict[str, Any]]] = {}
+# Events appended since a namespace's last shard write go to an append-only JSONL log,
+# <shard>.<generation>.log, replayed on load. Each shard write moves to a new generation.
+_log_gens: Dict[str, int] = {}
+_unsnapshotted: set = set()  # namespaces whose live log holds events
+# What the cached copy was read from: the shard's (inode, mtime_ns, size), None if it
+# had no shard, and how many bytes of the live log have been applied. Another
+# process's write shows up as a different stamp or a longer log.
+_shard_stamps: Dict[str, Optional[Tuple[int, int, int]]] = {}
+_log_offsets: Dict[str, int] = {}
+_legacy: Optional[Dict[str, Any]] = None
 
-def _ensure_dir():
+def _read_json(path: Path) -> Any:
+    if not path.exists():
+        return None
     try:
-        BASE.mkdir(parents=True, exist_ok=True)
+        raw = path.read_bytes()
+        return jsonfast.loads(raw) if raw.strip() else None
     except Exception: # pylint: disable=broad-exception-caught
-        pass
+        return None
 
-def _load() -> Dict[str, Any]:
-    with _lock:
-        if not STORE_FILE.exists():
-            return {}
+def _legacy_store() -> Dict[str, Any]:
+    """The old whole-store file, parsed once per process."""
+    global _legacy # pylint: disable=global-statement
+    if _legacy is None:
+        data = _read_json(STORE_FILE)
+        _legacy = data if isinstance(data, dict) else {}
+    return _legacy
+
+def _shard_path(namespace: str) -> Path:
+    return SHARDS_DIR / f"{hashlib.sha1(namespace.encode('utf-8')).hexdigest()}.json"
+
+def _log_path(namespace: str, gen: int) -> Path:
+    return _shard_path(namespace).with_suffix(f".{gen}.log")
+
+def _file_stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on `path`, shared by every process using the store."""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
         try:
-            txt = STORE_FILE.read_text(encoding="utf-8")
-            return json.loads(txt) if txt.strip() else {}
-        except Exception: # pylint: disable=broad-exception-caught
-            return {}
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def _locked_ns(namespace: str) -> Iterator[None]:
+    """Hold a namespace for a read-modify-write, starting from its latest on-disk state."""
+    with _lock, _file_lock(_shard_path(namespace).with_suffix(".lock")):
+        _load_ns(namespace)
+        yield
 
-def _atomic_write(path: Path, data: str):
-    _ensure_dir()
+def _read_log_tail(namespace: str) -> None:
+    """Apply events appended to the live log since it was last read; a torn trailing line waits."""
+    path = _log_path(namespace, _log_gens[namespace])
+    offset = _log_offsets.get(namespace, 0)
+    stamp = _file_stamp(path)
+    if stamp is None or stamp[2] <= offset:
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        chunk = f.read(stamp[2] - offset)
+    end = chunk.rfind(b"\n") + 1
+    if not end:
+        return
+    _log_offsets[namespace] = offset + end
+    events: List[Dict[str, Any]] = []
+    for line in chunk[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            events.append(jsonfast.loads(line))
+        except jsonfast.JSONDecodeError:
+            continue
+    if events:
+        _apply_events(_shards[namespace], events)
+        _unsnapshotted.add(namespace)
+
+def _read_ns(namespace: str, stamp: Optional[Tuple[int, int, int]]) -> None:
+    _shard_stamps[namespace] = stamp
+    _unsnapshotted.discard(namespace)
+    doc = _read_json(_shard_path(namespace)) if stamp is not None else None
+    if isinstance(doc, dict) and isinstance(doc.get("value"), dict):
+        if isinstance(doc["value"].get("events"), list):
+            _intern_events(doc["value"]["events"])
+        _shards[namespace] = doc["value"]
+        _log_gens[namespace] = int(doc.get("log_gen", 0))
+        _log_offsets[namespace] = 0
+        _read_log_tail(namespace)
+    else:
+        _shards[namespace] = _legacy_store().get(namespace)
+        _log_gens.pop(namespace, None)
+
+def _load_ns(namespace: str) -> Optional[Dict[str, Any]]:
+    """Return a namespace's data from the in-process cache, re-reading it when another process changed it.
+
+    Values are returned by reference, for this module only; get() hands out copies.
+    """
+    with _lock:
+        stamp = _file_stamp(_shard_path(namespace))
+        if namespace not in _shards or stamp != _shard_stamps.get(namespace):
+            _read_ns(namespace, stamp)
+        elif namespace in _log_gens:
+            _read_log_tail(namespace)
+        return _shards[namespace]
+
+def _writable_ns(namespace: str) -> Dict[str, Any]:
+    data = _load_ns(namespace)
+    if data is None:
+        data = _shards[namespace] = {}
+    return data
+
+def _atomic_write(path: Path, data: bytes):
     dirp = path.parent
-    with tempfile.NamedTemporaryFile("w", dir=str(dirp), delete=False, encoding="utf-8") as tf:
+    dirp.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=str(dirp), delete=False) as tf:
         tf.write(data)
         tmp = tf.name
-    Path(tmp).replace(path)
+    os.replace(tmp, path)
+
+def _save_ns(namespace: str):
+    """Rewrite only this namespace's shard, folding in (and retiring) its event log.
 
-def _save(d: Dict[str, Any]):
+    Callers hold _locked_ns(namespace).
+    """
     with _lock:
-        payload = json.dumps(d, indent=2, ensure_ascii=False)
-        _atomic_write(STORE_FILE, payload)
+        old_gen = _log_gens.get(namespace, 0)
+        rotate = namespace in _unsnapshotted
+        gen = old_gen + 1 if rotate else old_gen
+        doc = {"namespace": namespace, "value": _shards[namespace], "log_gen": gen}
+        path = _shard_path(namespace)
+        _atomic_write(path, jsonfast.dumpb(doc, indent=True))
+        _shard_stamps[namespace] = _file_stamp(path)
+        _log_gens[namespace] = gen
+        if rotate:
+            # The shard now points at an empty generation, so the old log is never replayed again
+            _unsnapshotted.discard(namespace)
+            _log_offsets[namespace] = 0
+            _log_path(namespace, old_gen).unlink(missing_ok=True)
+
+def _detached(value: Any) -> Any:
+    """Copy of a stored (JSON-shaped) value that shares no dict or list with it.
+
+    The cache is only changed by writes, so values cross its boundary as copies
+    in both directions; strings and numbers are immutable and stay shared.
+    """
+    if type(value) is dict: # pylint: disable=unidiomatic-typecheck
+        return {k: _detached(v) for k, v in value.items()}
+    if type(value) is list: # pylint: disable=unidiomatic-typecheck
+        return [_detached(v) for v in value]
+    return value
 
 def put(namespace: str, key: str, value: Any) -> None:
     """Store a value in the KV store."""
-    data = _load()
-    data.setdefault(namespace, {})
-    data[namespace][key] = value
-    _save(data)
+    value = _detached(value)
+    with _locked_ns(namespace):
+        _writable_ns(namespace)[key] = value
+        _save_ns(namespace)
+
+def put_batch(namespace: str, values: Dict[str, Any]) -> None:
+    """Store several keys of one namespace with a single shard write."""
+    if not values:
+        return
+    values = _detached(values)
+    with _locked_ns(namespace):
+        _writable_ns(namespace).update(values)
+        _save_ns(namespace)
 
 def get(namespace: str, key: Optional[str] = None, default: Any = None) -> Any:
-    """Retrieve a value from the KV store."""
-    data = _load()
-    ns = data.get(namespace)
-    if ns is None:
-        return default
-    if key is None or key == "":
-        return ns
-    return ns.get(key, default)
+    """Retrieve a copy of a value from the KV store; changes to it persist only through put()."""
+    with _lock:
+        ns = _load_ns(namespace)
+        if ns is None:
+            return default
+        if key is None or key == "":
+            return _detached(ns)
+        return _detached(ns.get(key, default))
 
 def query_prefix(namespace: str, prefix: str):
     """Query keys starting with a prefix."""
-    data = _load()
-    ns = data.get(namespace, {})
-    return {k:v for k,v in ns.items() if k.startswith(prefix)}
+    with _lock:
+        ns = _load_ns(namespace) or {}
+        return {k: _detached(v) for k, v in ns.items() if k.startswith(prefix)}
 
 def append_event(session_namespace: str, event: Dict[str, Any]) -> None:
     """Append an event to a session."""
-    data = _load()
-    session = data.get(session_namespace)
-    if not session:
-        session = {
-            "session_id": session_namespace,
-            "created_at": _now_iso(),
-            "events": [],
-            "state": {}
-        }
+    append_events(session_namespace, [event])
+
+# Event fields drawn from a handful of values ("user", "utterance", ...); the decoder
+# gives every event its own copy, so loaded events are pointed at one shared string
+_INTERNED_EVENT_FIELDS = ("role", "type")
+
+def _intern_events(events: List[Any]) -> None:
+    for ev in events:
+        if not isinstance(ev, dict):
+            continue
+        for field in _INTERNED_EVENT_FIELDS:
+            value = ev.get(field)
+            if type(value) is str: # pylint: disable=unidiomatic-typecheck
+                ev[field] = sys.intern(value)
+
+def _apply_events(session: Dict[str, Any], events: List[Dict[str, Any]]) -> None:
+    """Add events to a session dict and update its event bookkeeping."""
     session.setdefault("events", [])
     session.setdefault("state", {})
-    ev = dict(event)
-    ev.setdefault("event_id", f"evt-{int(datetime.utcnow().timestamp()*1000)}")
-    ev.setdefault("timestamp", _now_iso())
-    session["events"].append(ev)
-    session["state"]["last_event_ts"] = ev["timestamp"]
-    data[session_namespace] = session
-    _save(data)
+    _intern_events(events)
+    session["events"].extend(events)
+    state = session["state"]
+    state["last_event_ts"] = events[-1]["timestamp"]
+    state["events_since_compact"] = state.get("events_since_compact", 0) + len(events)
+
+def append_events(session_namespace: str, events: List[Dict[str, Any]]) -> None:
+    """Append several events to a session.
+
+    Events go to the session's append-only log; the shard itself is only
+    rewritten for a brand-new session or by the next put/compaction.
+    """
+    if not events:
+        return
+    stored = []
+    for event in events:
+        ev = dict(event)
+        now_ns = time.time_ns()
+        ev.setdefault("event_id", f"evt-{now_ns // 1_000_000}")
+        ev.setdefault("timestamp", utc_now_iso(now_ns))
+        stored.append(ev)
+    with _locked_ns(session_namespace):
+        session = _writable_ns(session_namespace)
+        is_new = not session
+        if is_new:
+            session.update({
+                "session_id": session_namespace,
+                "created_at": utc_now_iso(),
+                "events": [],
+                "state": {}
+            })
+        _apply_events(session, stored)
+        if is_new or session_namespace not in _log_gens:
+            # No shard on disk yet (new, or still only in the legacy store): write one
+            _save_ns(session_namespace)
+            return
+        path = _log_path(session_namespace, _log_gens.get(session_namespace, 0))
+        with open(path, "ab") as f:
+            f.write(b"".join(jsonfast.dumpb(ev) + b"\n" for ev in stored))
+            # Already applied above; only lines other processes add after this are read back
+            _log_offsets[session_namespace] = f.tell()
+        _unsnapshotted.add(session_namespace)
+
+def needs_compact(session_namespace: str, interval: int = 10) -> bool:
+    """True once at least `interval` events were appended since the last compaction."""
+    with _lock:
+        session = _load_ns(session_namespace)
+        if not session:
+            return False
+        state = session.get("state") or {}
+        pending = state.get("events_since_compact")
+        if pending is None:  # sessions written before the counter existed
+            pending = len(session.get("events") or [])
+        return pending >= interval
 
 def compact_session(session_namespace: str, keep_last: int = 5):
     """Compact session history."""
-    data = _load()
-    session = data.get(session_namespace, {})
-    if not session:
-        return {}
-    events = session.get("events", [])
-    kept = events[-keep_last:] if keep_last > 0 else []
-    user_texts = []
-    for e in kept:
-        role = e.get("role","")
-        content = e.get("content",{})
-        text = ""
-        if isinstance(content, dict):
-            text = content.get("text","") or content.get("message","")
-        else:
-            text = str(content or "")
-        if role == "user" and text:
-            user_texts.append(text.strip())
-    short_summary = " | ".join(user_texts[-3:])
-    session["events"] = kept
-    session.setdefault("state", {})
-    session["state"]["short_summary"] = short_summary
-    session["state"]["compacted_at"] = _now_iso()
-    data[session_namespace] = session
-    _save(data)
-    return session
+    with _locked_ns(session_namespace):
+        session = _load_ns(session_namespace)
+        if not session:
+            return {}
+        events = session.get("events", [])
+        kept = events[-keep_last:] if keep_last > 0 else []
+        user_texts = []
+        for e in kept:
+            role = e.get("role","")
+            content = e.get("content",{})
+            text = ""
+            if isinstance(content, dict):
+                text = content.get("text","") or content.get("message","")
+            else:
+                text = str(content or "")
+            if role == "user" and text:
+                user_texts.append(text.strip())
+        short_summary = " | ".join(user_texts[-3:])
+        session["events"] = kept
+        session.setdefault("state", {})
+        session["state"]["short_summary"] = short_summary
+        session["state"]["compacted_at"] = utc_now_iso()
+        session["state"]["events_since_compact"] = 0
+        _save_ns(session_namespace)
+        return _detached(session)
+
+def _chat_path(namespace: str, chat_key: str) -> Path:
+    safe_ns = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)
+    safe_key = re.sub(r"[^A-Za-z0-9_.-]", "_", chat_key)
+    return CHATS_DIR / safe_ns / f"{safe_key}.jsonl"
+
+def _chat_meta_path(path: Path) -> Path:
+    return path.with_suffix(".meta.json")
+
+def _write_chat_meta(path: Path, chat_key: str, count: int, meta: Optional[Dict[str, Any]]) -> None:
+    """Rewrite a transcript's small metadata file; callers hold the transcript's lock."""
+    old = _read_json(_chat_meta_path(path))
+    doc = {**(old if isinstance(old, dict) else {}), **(meta or {})}
+    doc.update({"chat_key": chat_key, "message_count": count, "updated_at": utc_now_iso()})
+    _atomic_write(_chat_meta_path(path), jsonfast.dumpb(doc))
+
+def _transcript_length(path: Path) -> int:
+    """Messages in a transcript: from its metadata, or by counting lines when it has none yet."""
+    meta = _read_json(_chat_meta_path(path))
+    if isinstance(meta, dict) and isinstance(meta.get("message_count"), int):
+        return meta["message_count"]
+    if not path.exists():
+        return 0
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+def append_message(namespace: str, chat_key: str, message: Dict[str, Any],
+                   meta: Optional[Dict[str, Any]] = None) -> None:
+    """Append one message to a chat transcript (one JSON object per line)."""
+    append_messages(namespace, chat_key, [message], meta)
+
+def append_messages(namespace: str, chat_key: str, messages: List[Dict[str, Any]],
+                    meta: Optional[Dict[str, Any]] = None) -> None:
+    """Append several messages to a chat transcript with a single write.
+
+    The transcript's <chat_key>.meta.json (message count, last update, plus any
+    `meta` fields) is rewritten alongside; it stays a few hundred bytes.
+    """
+    if not messages:
+        return
+    path = _chat_path(namespace, chat_key)
+    payload = b"".join(jsonfast.dumpb(m) + b"\n" for m in messages)
+    with _lock, _file_lock(path.with_suffix(".lock")):
+        count = _transcript_length(path)
+        with open(path, "ab") as f:
+            f.write(payload)
+        _write_chat_meta(path, chat_key, count + len(messages), meta)
+
+def load_chat_meta(namespace: str, chat_key: str) -> Dict[str, Any]:
+    """A chat transcript's metadata, or {} when it has none."""
+    meta = _read_json(_chat_meta_path(_chat_path(namespace, chat_key)))
+    return meta if isinstance(meta, dict) else {}
+
+def load_messages(namespace: str, chat_key: str) -> List[Dict[str, Any]]:
+    """Read a chat transcript back, skipping malformed lines."""
+    path = _chat_path(namespace, chat_key)
+    messages: List[Dict[str, Any]] = []
+    if not path.exists():
+        return messages
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                messages.append(jsonfast.loads(line))
+            except jsonfast.JSONDecodeError:
+                continue
+    return messages
+
+def replace_messages(namespace: str, chat_key: str, messages: List[Dict[str, Any]],
+                     meta: Optional[Dict[str, Any]] = None) -> None:
+    """Atomically rewrite a chat transcript (used for clears and migrations)."""
+    path = _chat_path(namespace, chat_key)
+    payload = b"".join(jsonfast.dumpb(m) + b"\n" for m in messages)
+    with _lock, _file_lock(path.with_suffix(".lock")):
+        _atomic_write(path, payload)
+        _write_chat_meta(path, chat_key, len(messages), meta)
+
+def _forget_cache():
+    """Drop the in-process cache so the next read comes from disk (tests only)."""
+    with _lock:
+        _shards.clear()
+        _log_gens.clear()
+        _unsnapshotted.clear()
+        _shard_stamps.clear()
+        _log_offsets.clear()
 
 def _reset_store():
-    _save({})
\ No newline at end of file
+    """Drop every namespace, in memory and on disk (tests only)."""
+    global _legacy # pylint: disable=global-statement
+    with _lock:
+        _forget_cache()
+        _legacy = {}
+        shutil.rmtree(SHARDS_DIR, ignore_errors=True)
+        _atomic_write(STORE_FILE, b"{}")
\ No newline at end of file
@@ -9,18 +9,46 @@ Improvements made:
 - Cap stored memories to avoid unbounded growth
 - Clearer docstrings and small helper methods
 """
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+import re
 
 from personalized_learning_coach.memory import kv_store
 from personalized_learning_coach.memory.session import Session
+from personalized_learning_coach.utils.cache import LRUCache
+from personalized_learning_coach.utils.clock import utc_now_iso
 
 logger = logging.getLogger(__name__)
 
 # Maximum number of memories to keep per user to avoid unbounded growth.
 MAX_MEMORIES = 1000
 
+# Insight keywords, each set compiled into one alternation so a text is scanned once per set
+_DIFFICULTY_RE = re.compile(
+    "|".join(map(re.escape, ("struggle", "struggling", "hard", "difficult", "cant", "can't", "frustrat"))),
+    re.IGNORECASE,
+)
+_PREFERENCE_RE = re.compile("|".join(("love", "like", "enjoy", "prefer")), re.IGNORECASE)
+_PERFORMANCE_RE = re.compile("score|mastery|accuracy", re.IGNORECASE)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Trigram postings per namespace, kept in memory only and keyed on the exact
+# contents they were built from, so any change to the stored items rebuilds them
+_INDEX_CACHE = LRUCache(maxsize=256)
+
+
+def _build_index(contents: Tuple[str, ...]) -> Dict[str, List[int]]:
+    """Map each trigram of the lowercased contents to the positions that contain it."""
+    postings: Dict[str, List[int]] = {}
+    for pos, content in enumerate(contents):
+        for gram in _trigrams(content.lower()):
+            postings.setdefault(gram, []).append(pos)
+    return postings
+
 
 class MemoryManager:
     """Manages the 'filing cabinet' for long-term knowledge.
@@ -40,7 +68,7 @@ class MemoryManager:
 
     def _now_iso(self) -> str:
         # UTC timestamp with Z suffix for clarity
-        return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        return utc_now_iso(fraction=False)
 
     def _load_memories(self) -> List[Dict[str, Any]]:
         try:
@@ -49,6 +77,16 @@ class MemoryManager:
             logger.exception("Failed to load memories for %s", self.namespace)
             return []
 
+    def _postings(self, memories: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Trigram postings for memories, rebuilt whenever their contents differ from the cached ones."""
+        contents = tuple(m.get("content") or "" for m in memories)
+        cached = _INDEX_CACHE.get(self.namespace)
+        if cached is not None and cached[0] == contents:
+            return cached[1]
+        postings = _build_index(contents)
+        _INDEX_CACHE.put(self.namespace, (contents, postings))
+        return postings
+
     def _save_memories(self, memories: List[Dict[str, Any]]) -> None:
         # keep only the most recent MAX_MEMORIES (operate on a copy)
         try:
@@ -64,28 +102,38 @@ class MemoryManager:
             content: short text describing the memory.
             metadata: optional dictionary with extra fields (e.g. source_session)
         """
-        if not content or not str(content).strip():
-            # don't persist empty memories
-            logger.debug("Skipping add_memory with empty content (user=%s)", self.user_id)
-            return
+        self.add_memories([(content, metadata)])
 
-        if metadata is None:
-            metadata = {}
+    def add_memories(self, items: List[Tuple[str, Optional[Dict[str, Any]]]]) -> None:
+        """Adds several memory items with a single load and save.
 
-        memory_item: Dict[str, Any] = {
-            "content": str(content).strip(),
-            "metadata": metadata,
-            "created_at": self._now_iso(),
-        }
+        Args:
+            items: (content, metadata) pairs, stored in order; empty contents are skipped.
+        """
+        created_at = self._now_iso()
+        new_items: List[Dict[str, Any]] = []
+        for content, metadata in items:
+            if not content or not str(content).strip():
+                # don't persist empty memories
+                logger.debug("Skipping add_memory with empty content (user=%s)", self.user_id)
+                continue
+            new_items.append({
+                "content": str(content).strip(),
+                "metadata": metadata if metadata is not None else {},
+                "created_at": created_at,
+            })
+        if not new_items:
+            return
 
         memories = self._load_memories()
-        memories.append(memory_item)
+        memories.extend(new_items)
         self._save_memories(memories)
 
     def get_memories(self, query: Optional[str] = None) -> List[Dict[str, Any]]:
         """Retrieve memories, optionally filtered by a simple substring query.
 
-        This is intentionally simple — in future replace with vector similarity.
+        Queries of three or more characters only check memories that contain
+        every trigram of the query. In future replace with vector similarity.
         """
         memories = self._load_memories()
         if not query:
@@ -95,8 +143,15 @@ class MemoryManager:
         if not q:
             return memories
 
+        candidates = memories
+        if len(q) >= 3 and memories:
+            postings = self._postings(memories)
+            lists = sorted((postings.get(gram, []) for gram in _trigrams(q)), key=len)
+            hits = set(lists[0]).intersection(*lists[1:])
+            candidates = [memories[i] for i in sorted(hits)]
+
         filtered: List[Dict[str, Any]] = []
-        for m in memories:
+        for m in candidates:
             content = (m.get("content") or "").lower()
             if q in content:
                 filtered.append(m)
@@ -159,30 +214,27 @@ class MemoryManager:
 
         # Persist extracted memories, attach source_session when possible
         session_id = getattr(session, "session_id", None) or getattr(session, "id", None)
-        for mem in new_memories:
-            meta: Dict[str, Any] = {}
-            if session_id:
-                meta["source_session"] = session_id
-            self.add_memory(mem, metadata=meta)
+        self.add_memories([
+            (mem, {"source_session": session_id} if session_id else {})
+            for mem in new_memories
+        ])
 
         return new_memories
 
     def _extract_insight(self, text: str, role: str, event_type: str, memories: List[str]):
         """Helper to extract insights from a single text item."""
-        text_lower = text.lower()
-
         # Simple heuristics for user utterances
         if role == "user":
-            if any(k in text_lower for k in ("struggle", "struggling", "hard", "difficult", "cant", "can't", "frustrat")):
+            if _DIFFICULTY_RE.search(text):
                 insight = f"User reported difficulty: {text}"
                 memories.append(insight)
-            if any(k in text_lower for k in ("love", "like", "enjoy", "prefer")):
+            if _PREFERENCE_RE.search(text):
                 insight = f"User preference: {text}"
                 memories.append(insight)
 
         # Agent/tool outputs may contain graded results or metrics
         if role in ("agent", "system"):
-            if "score" in text_lower or "mastery" in text_lower or "accuracy" in text_lower:
+            if _PERFORMANCE_RE.search(text):
                 insight = f"Performance record: {text}"
                 memories.append(insight)
 
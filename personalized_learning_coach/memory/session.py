@@ -1,8 +1,8 @@
 # personalized_learning_coach/memory/session.py
 """Session management for the personalized learning coach."""
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
 from personalized_learning_coach.memory import kv_store
+from personalized_learning_coach.utils.clock import utc_now_iso
 
 class Session:
     """Manages a single user session."""
@@ -13,13 +13,12 @@ class Session:
     def _ensure_exists(self):
         data = kv_store.get(self.session_id)
         if not data:
-            kv_store.put(self.session_id, "events", [])
-            kv_store.put(self.session_id, "state", {})
+            kv_store.put_batch(self.session_id, {"events": [], "state": {}})
             self.add_event("system", "Session started", event_type="system")
 
     def add_event(self, role: str, content: Any, event_type: str = "utterance"):
         """Add an event to the session history."""
-        event = {"role": role, "type": event_type, "content": content, "timestamp": datetime.utcnow().isoformat()+"Z"}
+        event = {"role": role, "type": event_type, "content": content, "timestamp": utc_now_iso()}
         append = getattr(kv_store, "append_event", None)
         try:
             if callable(append):
@@ -30,15 +29,13 @@ class Session:
         except Exception: # pylint: disable=broad-exception-caught
             pass
             
-        sess = kv_store.get(self.session_id) or {"events": [], "state": {}}
-        events = sess.get("events") or []
+        events = kv_store.get(self.session_id, "events") or []
         events.append(event)
         kv_store.put(self.session_id, "events", events)
 
     def get_events(self) -> List[Dict[str, Any]]:
         """Retrieve all events for this session."""
-        data = kv_store.get(self.session_id) or {}
-        return data.get("events") or []
+        return kv_store.get(self.session_id, "events") or []
 
     def get_last_event(self) -> Optional[Dict[str, Any]]:
         """Retrieve the most recent event."""
@@ -47,8 +44,7 @@ class Session:
 
     def get_state(self) -> Dict[str, Any]:
         """Retrieve the current session state."""
-        data = kv_store.get(self.session_id) or {}
-        return data.get("state") or {}
+        return kv_store.get(self.session_id, "state") or {}
 
     def update_state(self, key: str, value: Any):
         """Update a specific key in the session state."""
@@ -56,6 +52,17 @@ class Session:
         state[key] = value
         kv_store.put(self.session_id, "state", state)
 
+    def update_many(self, values: Dict[str, Any], removed: Iterable[str] = ()):
+        """Update several keys in the session state, and drop the `removed` ones, with a single write."""
+        removed = list(removed)
+        if not values and not removed:
+            return
+        state = self.get_state()
+        state.update(values)
+        for key in removed:
+            state.pop(key, None)
+        kv_store.put(self.session_id, "state", state)
+
     def compact(self, keep_last: int = 10):
         """Compact the session history, keeping only the most recent events."""
         fn = getattr(kv_store, "compact_session", None)
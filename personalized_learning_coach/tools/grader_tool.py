@@ -1,5 +1,5 @@
 # personalized_learning_coach/tools/grader_tool.py
-from typing import Any, Dict
+from typing import Any, Dict, List
 import difflib
 import re
 from fractions import Fraction
@@ -67,4 +67,10 @@ def grade_question(*args, **kwargs):
         if answer is None and len(args)>=2:
             answer = args[1]
         mode = kwargs.get("mode","mixed") if kwargs.get("mode") is not None else (args[2] if len(args)>=3 else "mixed")
-    return GraderTool().grade(expected=expected, answer=answer, mode=mode)
\ No newline at end of file
+    return GraderTool().grade(expected=expected, answer=answer, mode=mode)
+
+
+def grade_questions_batch(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Grade several {expected, answer, mode} payloads with one grader; results keep input order."""
+    grader = GraderTool()
+    return [grader.grade(expected=p.get("expected"), answer=p.get("answer"), mode=p.get("mode", "mixed")) for p in payloads]
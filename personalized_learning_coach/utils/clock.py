@@ -0,0 +1,25 @@
+# personalized_learning_coach/utils/clock.py
+"""UTC timestamp formatting shared by the store, memories and progress records."""
+import time
+from typing import Optional, Tuple
+
+# (epoch second, its "YYYY-MM-DDTHH:MM:SS" text); replaced as a whole so threads never see a torn pair
+_SECOND_TEXT: Tuple[int, str] = (0, "")
+
+
+def utc_now_iso(ns: Optional[int] = None, fraction: bool = True) -> str:
+    """UTC "YYYY-MM-DDTHH:MM:SS.ffffffZ" for `ns` (epoch nanoseconds, default now).
+
+    With fraction=False the microseconds are left out. The seconds part is
+    formatted at most once per second.
+    """
+    global _SECOND_TEXT # pylint: disable=global-statement
+    if ns is None:
+        ns = time.time_ns()
+    sec, rem = divmod(ns, 1_000_000_000)
+    cached = _SECOND_TEXT
+    if cached[0] != sec:
+        cached = _SECOND_TEXT = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)))
+    if not fraction:
+        return cached[1] + "Z"
+    return f"{cached[1]}.{rem // 1000:06d}Z"
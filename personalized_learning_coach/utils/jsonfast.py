@@ -0,0 +1,57 @@
+# personalized_learning_coach/utils/jsonfast.py
+"""JSON helpers that use orjson when it is installed and stdlib json otherwise."""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so one name covers both
+JSONDecodeError = json.JSONDecodeError
+
+_DECODER = json.JSONDecoder()
+
+
+def dumpb(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize obj to UTF-8 encoded JSON bytes."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return dumps(obj, indent=indent, sort_keys=sort_keys).encode("utf-8")
+
+
+def dumps(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serialize obj to a JSON string (non-ASCII characters are kept as-is)."""
+    if orjson is not None:
+        return dumpb(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None, sort_keys=sort_keys)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON document from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def extract(text: str, opener: str = "[", max_attempts: int = 8) -> Any:
+    """Decode the first JSON value starting at `opener` inside free-form text.
+
+    Uses a single raw_decode scan per candidate position instead of slicing
+    to the last closing bracket. Returns None when no candidate decodes.
+    """
+    start = text.find(opener)
+    attempts = 0
+    while start != -1 and attempts < max_attempts:
+        try:
+            return _DECODER.raw_decode(text, start)[0]
+        except json.JSONDecodeError:
+            attempts += 1
+            start = text.find(opener, start + 1)
+    return None
@@ -1,10 +1,139 @@
+import asyncio
+import hashlib
 import os
 import json
 import logging
-from typing import Optional
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from personalized_learning_coach.utils.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Retry policy for rate-limited (429 / RESOURCE_EXHAUSTED) Gemini calls
+MAX_RETRIES = 3
+BASE_RETRY_DELAY = 2
+# Default cap on concurrent requests for callers that fan calls out (evaluate_many, arun_many)
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+
+
+# None until the first probe; then whether google-genai imported successfully
+_GENAI_AVAILABLE: Optional[bool] = None
+
+
+def _genai_available() -> bool:
+    """Import google-genai on first use only and remember whether it worked."""
+    global _GENAI_AVAILABLE
+    if _GENAI_AVAILABLE is None:
+        try:
+            import google.genai  # noqa: F401
+            _GENAI_AVAILABLE = True
+        except ImportError:
+            logger.warning("USE_GEMINI=1 but google-genai package not found.")
+            _GENAI_AVAILABLE = False
+        except Exception as e:
+            logger.exception("Error checking google-genai availability: %s", e)
+            _GENAI_AVAILABLE = False
+    return _GENAI_AVAILABLE
+
+
+# Response cache, enabled with LLM_CACHE_ENABLED=1: an in-process LRU in front of
+# a SQLite table so identical prompts skip the round trip across restarts too
+LLM_CACHE_FILE = Path(os.environ.get(
+    "LLM_CACHE_PATH", Path(__file__).resolve().parent.parent / "memory" / "llm_cache.sqlite"
+))
+_RESPONSE_CACHE = LRUCache(maxsize=1024)
+_cache_db: Optional[sqlite3.Connection] = None
+_cache_db_lock = threading.Lock()
+# Prompts embedding a timestamp are one-off by construction
+_VOLATILE_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+
+
+def _llm_cache_enabled() -> bool:
+    return os.environ.get("LLM_CACHE_ENABLED", "0") not in ("0", "", "false", "False")
+
+
+def _response_db() -> sqlite3.Connection:
+    global _cache_db
+    if _cache_db is None:
+        LLM_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        _cache_db = sqlite3.connect(str(LLM_CACHE_FILE), check_same_thread=False)
+        _cache_db.execute("CREATE TABLE IF NOT EXISTS llm_cache(h TEXT PRIMARY KEY, response TEXT, ts REAL)")
+    return _cache_db
+
+
+def _cached_response(key: str) -> Optional[str]:
+    text = _RESPONSE_CACHE.get(key)
+    if text is not None:
+        return text
+    try:
+        with _cache_db_lock:
+            row = _response_db().execute("SELECT response FROM llm_cache WHERE h = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        logger.exception("LLM cache lookup failed")
+        return None
+    if row is None:
+        return None
+    _RESPONSE_CACHE.put(key, row[0])
+    return row[0]
+
+
+def _remember_response(key: str, text: str) -> None:
+    _RESPONSE_CACHE.put(key, text)
+    try:
+        with _cache_db_lock:
+            db = _response_db()
+            db.execute("INSERT OR REPLACE INTO llm_cache(h, response, ts) VALUES (?, ?, ?)", (key, text, time.time()))
+            db.commit()
+    except sqlite3.Error:
+        logger.exception("LLM cache write failed")
+
+
+# Provider-side context caches for long, static system instructions (LLM_PROMPT_CACHE_ENABLED=1).
+# Gemini refuses caches below a model-specific token minimum, so short instructions stay inline.
+PROMPT_CACHE_MIN_CHARS = int(os.environ.get("LLM_PROMPT_CACHE_MIN_CHARS", "1000"))
+PROMPT_CACHE_TTL = int(os.environ.get("LLM_PROMPT_CACHE_TTL", "3600"))
+# {(model, API key digest, instruction digest): (cache name or None if creation failed, renew-after epoch)};
+# caches belong to the project of the key that created them
+_PROMPT_CACHES: Dict[Tuple[str, str, str], Tuple[Optional[str], float]] = {}
+_prompt_caches_creating: set = set()  # keys whose cache is being created right now
+_prompt_cache_lock = threading.Lock()  # guards the two above, never held across a request
+
+
+def _prompt_cache_enabled() -> bool:
+    return os.environ.get("LLM_PROMPT_CACHE_ENABLED", "0") not in ("0", "", "false", "False")
+
+
+@lru_cache(maxsize=8)
+def _genai_client(api_key: Optional[str]):
+    """Build the google-genai client once per API key and reuse it across calls."""
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+# Async clients per event loop and API key. The SDK's aio transport binds to the loop
+# it first runs on, so each asyncio.run() gets its own instead of one from a closed loop.
+_AIO_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Optional[str], Any]]" = weakref.WeakKeyDictionary()
+_aio_clients_lock = threading.Lock()
+
+
+def _genai_aio_client(api_key: Optional[str]):
+    """The google-genai async client for the running event loop, or None if the SDK has none."""
+    loop = asyncio.get_running_loop()
+    with _aio_clients_lock:
+        clients = _AIO_CLIENTS.setdefault(loop, {})
+        if api_key not in clients:
+            from google import genai
+            clients[api_key] = getattr(genai.Client(api_key=api_key), "aio", None)
+        return clients[api_key]
+
+
 class LLMClient:
     """LLM client wrapper that uses Google GenAI (Gemini) when enabled.
 
@@ -23,16 +152,100 @@ class LLMClient:
         use_gemini = os.environ.get("USE_GEMINI", "0") not in ("0", "", "false", "False")
         if not use_gemini:
             return False
-        
+        return _genai_available()
+
+    def _fallback(self, prompt: str) -> str:
+        self.logger.info("Gemini disabled or unavailable, returning fallback response")
+        return json.dumps({
+            "summary": "Gemini disabled - enable with USE_GEMINI=1 and set GOOGLE credentials",
+            "prompt_echo": (prompt or "")[:400]
+        })
+
+    @staticmethod
+    def _full_prompt(prompt: str, system_instruction: Optional[str]) -> str:
+        if system_instruction:
+            return f"System Instruction: {system_instruction}\n\n{prompt}"
+        return prompt
+
+    def _cached_content(self, client, api_key: Optional[str], system_instruction: Optional[str]) -> Optional[str]:
+        """Name of a Gemini context cache holding system_instruction, created on first use.
+
+        Only one thread creates a given cache; others meanwhile reuse the previous
+        name (still alive until its server-side TTL) or send the instruction inline.
+        """
+        if not system_instruction or len(system_instruction) < PROMPT_CACHE_MIN_CHARS or not _prompt_cache_enabled():
+            return None
+        key = (
+            self.model,
+            hashlib.blake2b((api_key or "").encode("utf-8"), digest_size=8).hexdigest(),
+            hashlib.blake2b(system_instruction.encode("utf-8"), digest_size=16).hexdigest(),
+        )
+        with _prompt_cache_lock:
+            name, renew_at = _PROMPT_CACHES.get(key, (None, 0.0))
+            if time.time() < renew_at or key in _prompt_caches_creating:
+                return name
+            _prompt_caches_creating.add(key)
         try:
-            import google.genai
-            return True
-        except ImportError:
-            self.logger.warning("USE_GEMINI=1 but google-genai package not found.")
-            return False
+            from google.genai import types
+            cache = client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction, ttl=f"{PROMPT_CACHE_TTL}s"
+                ),
+            )
+            name = cache.name
         except Exception as e:
-            self.logger.exception("Error checking google-genai availability: %s", e)
-            return False
+            # Usually too few tokens for this model; don't ask again until the TTL would have run out
+            logger.warning("Gemini context cache unavailable, sending system instruction inline: %s", e)
+            name = None
+        with _prompt_cache_lock:
+            # Renew ahead of the server-side expiry so requests never reference a dead cache
+            _PROMPT_CACHES[key] = (name, time.time() + PROMPT_CACHE_TTL * 0.9)
+            _prompt_caches_creating.discard(key)
+        return name
+
+    def _request(self, prompt: str, system_instruction: Optional[str], cached_content: Optional[str]) -> Dict[str, Any]:
+        """Keyword arguments for models.generate_content."""
+        if cached_content is None:
+            return {"model": self.model, "contents": self._full_prompt(prompt, system_instruction)}
+        from google.genai import types
+        return {
+            "model": self.model,
+            "contents": prompt,
+            "config": types.GenerateContentConfig(cached_content=cached_content),
+        }
+
+    def _cache_key(self, prompt: str, system_instruction: Optional[str]) -> Optional[str]:
+        """Key for the response cache, or None when caching is off or the prompt is volatile."""
+        if not _llm_cache_enabled() or _VOLATILE_RE.search(prompt):
+            return None
+        raw = "\0".join((self.model, system_instruction or "", prompt))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _response_text(response) -> str:
+        if hasattr(response, "text") and response.text:
+            return response.text
+        elif hasattr(response, "candidates") and response.candidates:
+            # Fallback for candidates
+            parts = []
+            for c in response.candidates:
+                if hasattr(c, "content") and hasattr(c.content, "parts"):
+                    for p in c.content.parts:
+                        if hasattr(p, "text"):
+                            parts.append(p.text)
+            if parts:
+                return "\n".join(parts)
+        
+        return str(response)
+
+    @staticmethod
+    def _retry_delay(e: Exception, attempt: int) -> Optional[float]:
+        """Backoff delay for a rate-limited attempt, or None when the error is final."""
+        error_str = str(e)
+        if ("429" in error_str or "RESOURCE_EXHAUSTED" in error_str) and attempt < MAX_RETRIES - 1:
+            return BASE_RETRY_DELAY * (2 ** attempt)
+        return None
 
     def generate_content(self, prompt: str, system_instruction: Optional[str] = None, max_tokens: int = 512) -> str:
         """Return string content for the given prompt.
@@ -41,55 +254,115 @@ class LLMClient:
         When disabled or if an error occurs, we return a deterministic mock string.
         """
         if not self._is_gemini_enabled():
-            self.logger.info("Gemini disabled or unavailable, returning fallback response")
-            return json.dumps({
-                "summary": "Gemini disabled - enable with USE_GEMINI=1 and set GOOGLE credentials",
-                "prompt_echo": (prompt or "")[:400]
-            })
-
-        import time
-        from google import genai
-        
-        max_retries = 3
-        base_delay = 2
+            return self._fallback(prompt)
+
+        cache_key = self._cache_key(prompt, system_instruction)
+        if cache_key is not None:
+            cached = _cached_response(cache_key)
+            if cached is not None:
+                return cached
 
-        for attempt in range(max_retries):
+        for attempt in range(MAX_RETRIES):
             try:
                 # Use the new google-genai SDK pattern
-                client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
-                
-                full_prompt = prompt
-                if system_instruction:
-                    full_prompt = f"System Instruction: {system_instruction}\n\n{prompt}"
-
-                response = client.models.generate_content(
-                    model=self.model,
-                    contents=full_prompt,
-                )
-                
-                if hasattr(response, "text") and response.text:
-                    return response.text
-                elif hasattr(response, "candidates") and response.candidates:
-                    # Fallback for candidates
-                    parts = []
-                    for c in response.candidates:
-                        if hasattr(c, "content") and hasattr(c.content, "parts"):
-                            for p in c.content.parts:
-                                if hasattr(p, "text"):
-                                    parts.append(p.text)
-                    if parts:
-                        return "\n".join(parts)
-                
-                return str(response)
+                api_key = os.environ.get("GOOGLE_API_KEY")
+                client = _genai_client(api_key)
+                cached_content = self._cached_content(client, api_key, system_instruction)
+                response = client.models.generate_content(**self._request(prompt, system_instruction, cached_content))
+                text = self._response_text(response)
+                if cache_key is not None:
+                    _remember_response(cache_key, text)
+                return text
 
             except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    if attempt < max_retries - 1:
-                        delay = base_delay * (2 ** attempt)
-                        logger.warning(f"Gemini 429 Rate Limit. Retrying in {delay}s...")
-                        time.sleep(delay)
-                        continue
+                delay = self._retry_delay(e, attempt)
+                if delay is not None:
+                    logger.warning(f"Gemini 429 Rate Limit. Retrying in {delay}s...")
+                    time.sleep(delay)
+                    continue
                 
                 logger.exception("Gemini generate failed: %s", e)
-                return json.dumps({"summary": "Gemini generate raised error", "error": str(e)})
\ No newline at end of file
+                return json.dumps({"summary": "Gemini generate raised error", "error": str(e)})
+
+    def generate_content_stream(self, prompt: str, system_instruction: Optional[str] = None, max_tokens: int = 512) -> Iterator[str]:
+        """Yield the reply to prompt in pieces as Gemini produces them.
+
+        Falls back and caches like generate_content. A rate-limited request is
+        only retried while nothing has been yielded yet.
+        """
+        if not self._is_gemini_enabled():
+            yield self._fallback(prompt)
+            return
+
+        cache_key = self._cache_key(prompt, system_instruction)
+        if cache_key is not None:
+            cached = _cached_response(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        for attempt in range(MAX_RETRIES):
+            parts = []
+            try:
+                api_key = os.environ.get("GOOGLE_API_KEY")
+                client = _genai_client(api_key)
+                cached_content = self._cached_content(client, api_key, system_instruction)
+                for chunk in client.models.generate_content_stream(**self._request(prompt, system_instruction, cached_content)):
+                    text = getattr(chunk, "text", None)
+                    if text:
+                        parts.append(text)
+                        yield text
+                if cache_key is not None and parts:
+                    _remember_response(cache_key, "".join(parts))
+                return
+
+            except Exception as e:
+                delay = None if parts else self._retry_delay(e, attempt)
+                if delay is not None:
+                    logger.warning(f"Gemini 429 Rate Limit. Retrying in {delay}s...")
+                    time.sleep(delay)
+                    continue
+
+                logger.exception("Gemini stream failed: %s", e)
+                if not parts:
+                    yield json.dumps({"summary": "Gemini generate raised error", "error": str(e)})
+                return
+
+    async def agenerate_content(self, prompt: str, system_instruction: Optional[str] = None, max_tokens: int = 512) -> str:
+        """Async counterpart of generate_content.
+
+        Uses the SDK's native async client (`client.aio`) when available and
+        otherwise runs the blocking call in a worker thread.
+        """
+        if not self._is_gemini_enabled():
+            return self._fallback(prompt)
+
+        cache_key = self._cache_key(prompt, system_instruction)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(_cached_response, cache_key)
+            if cached is not None:
+                return cached
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                api_key = os.environ.get("GOOGLE_API_KEY")
+                client = _genai_client(api_key)
+                aio = _genai_aio_client(api_key)
+                if aio is None:
+                    return await asyncio.to_thread(self.generate_content, prompt, system_instruction, max_tokens)
+                cached_content = await asyncio.to_thread(self._cached_content, client, api_key, system_instruction)
+                response = await aio.models.generate_content(**self._request(prompt, system_instruction, cached_content))
+                text = self._response_text(response)
+                if cache_key is not None:
+                    await asyncio.to_thread(_remember_response, cache_key, text)
+                return text
+
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is not None:
+                    logger.warning(f"Gemini 429 Rate Limit. Retrying in {delay}s...")
+                    await asyncio.sleep(delay)
+                    continue
+
+                logger.exception("Gemini generate failed: %s", e)
+                return json.dumps({"summary": "Gemini generate raised error", "error": str(e)})
@@ -0,0 +1,19 @@
+"""Shared pytest fixtures."""
+import pytest
+
+from observability import tracer
+from personalized_learning_coach.memory import kv_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_store(tmp_path, monkeypatch):
+    """Point the KV store and the trace log at tmp_path so tests leave the checkout untouched."""
+    tracer.flush_traces()
+    monkeypatch.setattr(kv_store, "STORE_FILE", tmp_path / "store.json")
+    monkeypatch.setattr(kv_store, "SHARDS_DIR", tmp_path / "ns")
+    monkeypatch.setattr(kv_store, "CHATS_DIR", tmp_path / "chats")
+    monkeypatch.setattr(tracer, "TRACE_PATH", str(tmp_path / "traces.jsonl"))
+    kv_store._reset_store() # pylint: disable=protected-access
+    yield tmp_path
+    tracer.flush_traces()
+    kv_store._forget_cache() # pylint: disable=protected-access
@@ -49,4 +49,55 @@ def test_assessment_basic():
     # Check session stored in KV store
     sess = get(f"session:{uid}", None)
     assert sess is not None, "Expected a session object stored in KV store"
-    assert "events" in sess, "Session should contain an 'events' key"
\ No newline at end of file
+    assert "events" in sess, "Session should contain an 'events' key"
+
+def test_assessment_arun_matches_run():
+    _reset_store()
+    agent = AssessmentAgent("testuser-async")
+
+    questions = agent.run(None)["questions"]
+    answers = {qobj.get("qid"): qobj.get("answer", "") for qobj in questions}
+    answers[questions[0]["qid"]] = ""  # one wrong answer
+
+    sync_result = agent.run({"answers": answers, "questions": questions})
+    async_result = asyncio.run(agent.arun({"answers": answers, "questions": questions}))
+
+    assert [r["qid"] for r in async_result["results"]] == [q["qid"] for q in questions]
+    assert async_result["results"] == sync_result["results"]
+    assert async_result["avg_score"] == sync_result["avg_score"]
+
+
+def test_arun_grades_freeform_batches_concurrently(monkeypatch):
+    from personalized_learning_coach.agents import assessment_agent
+    import threading
+    import time
+
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "calls": 0}
+    real_batch = assessment_agent.grade_questions_batch
+
+    def slow_batch(payloads):
+        with lock:
+            state["calls"] += 1
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return real_batch(payloads)
+
+    monkeypatch.setattr(assessment_agent, "grade_questions_batch", slow_batch)
+    monkeypatch.setattr(assessment_agent, "GRADER_BATCH_SIZE", 2)
+    monkeypatch.setattr(assessment_agent, "GRADER_CONCURRENCY", 2)
+
+    agent = AssessmentAgent("testuser-concurrent")
+    questions = [{"qid": f"f{i}", "prompt": f"Q{i}", "answer": f"answer {i}"} for i in range(7)]
+    answers = {q["qid"]: q["answer"] for q in questions}
+    answers["f3"] = "something else entirely"
+
+    result = asyncio.run(agent.arun({"answers": answers, "questions": questions}))
+
+    assert [r["qid"] for r in result["results"]] == [q["qid"] for q in questions]
+    assert [r["correct"] for r in result["results"]] == [i != 3 for i in range(7)]
+    assert state["calls"] == 4  # ceil(7 / 2) batches
+    assert state["peak"] == 2   # batches overlap, bounded by GRADER_CONCURRENCY
@@ -0,0 +1,35 @@
+"""Tests for the CoachAgent prompt context."""
+from personalized_learning_coach.agents.coach_agent import CONTEXT_MAX_ITEMS, CoachAgent
+from personalized_learning_coach.utils import jsonfast
+
+
+class _RecordingLLM:
+    """Stub LLM client that keeps the last prompt."""
+
+    prompt = None
+
+    def generate_content(self, prompt, system_instruction=None, max_tokens=512):
+        self.prompt = prompt
+        return '{"message": "Keep going!", "routine": ["Review", "Practice"]}'
+
+
+def _context(progress_data):
+    llm = _RecordingLLM()
+    assert CoachAgent("unittest", llm_client=llm).run(progress_data)["message"] == "Keep going!"
+    return jsonfast.loads(llm.prompt.split("context: ", 1)[1])
+
+
+def test_only_history_lists_are_trimmed():
+    context = _context({
+        "skill_id": "fractions",
+        "history": list(range(25)),
+        "quiz_history": [{"score": i} for i in range(12)],
+        "skills": [{"id": f"s{i}", "scores": list(range(15))} for i in range(15)],
+        "weak_areas": [f"w{i}" for i in range(12)],
+    })
+
+    assert context["history"] == list(range(25 - CONTEXT_MAX_ITEMS, 25))
+    assert context["quiz_history"] == [{"score": i} for i in range(12 - CONTEXT_MAX_ITEMS, 12)]
+    assert len(context["skills"]) == 15 and len(context["skills"][0]["scores"]) == 15
+    assert len(context["weak_areas"]) == 12
+    assert context["skill_id"] == "fractions"
@@ -1,4 +1,4 @@
-from personalized_learning_coach.tools.grader_tool import grade_question
+from personalized_learning_coach.tools.grader_tool import grade_question, grade_questions_batch
 
 def test_exact():
     r = grade_question({"expected": "3/4", "answer": "3/4", "mode": "exact"})
@@ -13,3 +13,11 @@ def test_fuzzy_text():
     r = grade_question({"expected": "The Pythagorean theorem", "answer": "pythagorean theorem", "mode": "fuzzy"})
     # either fully correct or high fuzzy score
     assert r.get("correct", False) is True or r.get("score", 0) >= 0.8
+
+def test_batch_matches_single():
+    payloads = [
+        {"expected": "3/4", "answer": "0.75", "mode": "mixed"},
+        {"expected": "The Pythagorean theorem", "answer": "pythagorean theorem", "mode": "fuzzy"},
+        {"expected": "photosynthesis", "answer": "respiration", "mode": "mixed"},
+    ]
+    assert grade_questions_batch(payloads) == [grade_question(p) for p in payloads]
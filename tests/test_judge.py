@@ -0,0 +1,51 @@
+"""Tests for LLMJudge async evaluation."""
+import asyncio
+import re
+import uuid
+
+from personalized_learning_coach.evaluation.judge import LLMJudge
+
+
+class _AsyncLLM:
+    """Stub async LLM client scoring each case by the digit in its user input."""
+
+    def __init__(self):
+        self.model = f"stub-judge-{uuid.uuid4().hex}"
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def agenerate_content(self, prompt, system_instruction=None, max_tokens=512):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        score = re.search(r"User Input: case (\d)", prompt).group(1)
+        return f'{{"score": {score}, "rationale": "case {score}"}}'
+
+
+def _item(n):
+    return {"user_input": f"case {n}", "agent_response": "reply", "expected_criteria": "criteria"}
+
+
+def test_evaluate_many_keeps_order_and_bounds_concurrency():
+    llm = _AsyncLLM()
+    judge = LLMJudge(llm_client=llm)
+
+    verdicts = asyncio.run(judge.evaluate_many([_item(n) for n in (5, 1, 4, 2, 3)], concurrency=2))
+
+    assert [v["score"] for v in verdicts] == [5, 1, 4, 2, 3]
+    assert verdicts[0]["rationale"] == "case 5"
+    assert llm.peak == 2
+
+
+def test_evaluate_many_reuses_verdicts_across_runs():
+    llm = _AsyncLLM()
+    judge = LLMJudge(llm_client=llm)
+
+    first = asyncio.run(judge.evaluate_many([_item(4), _item(2)]))
+    second = asyncio.run(judge.evaluate_many([_item(2), _item(4)]))
+
+    assert llm.calls == 2
+    assert second == first[::-1]
@@ -0,0 +1,70 @@
+"""Tests for the LLMClient response cache."""
+from types import SimpleNamespace
+
+import pytest
+
+from personalized_learning_coach.utils import llm_client
+from personalized_learning_coach.utils.llm_client import LLMClient
+
+
+class _StubModels:
+    """Stands in for genai.Client().models and counts requests."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return SimpleNamespace(text=f"reply {self.calls} from {model}")
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    """Route Gemini calls to a stub and the response cache to a fresh SQLite file."""
+    stub = _StubModels()
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "1")
+    monkeypatch.setattr(llm_client, "LLM_CACHE_FILE", tmp_path / "llm_cache.sqlite")
+    monkeypatch.setattr(llm_client, "_cache_db", None)
+    monkeypatch.setattr(llm_client, "_RESPONSE_CACHE", llm_client.LRUCache(maxsize=16))
+    monkeypatch.setattr(llm_client, "_genai_client", lambda api_key: SimpleNamespace(models=stub))
+    monkeypatch.setattr(LLMClient, "_is_gemini_enabled", lambda self: True)
+    yield stub
+    if llm_client._cache_db is not None: # pylint: disable=protected-access
+        llm_client._cache_db.close() # pylint: disable=protected-access
+
+
+def test_repeated_prompt_is_served_from_cache(models):
+    client = LLMClient(model="m1")
+    first = client.generate_content("explain loops", system_instruction="tutor")
+    again = client.generate_content("explain loops", system_instruction="tutor")
+    assert again == first == "reply 1 from m1"
+    assert models.calls == 1
+
+
+def test_cache_survives_a_restart_through_sqlite(models, monkeypatch):
+    LLMClient(model="m1").generate_content("explain loops")
+    # A new process starts with an empty in-memory LRU
+    monkeypatch.setattr(llm_client, "_RESPONSE_CACHE", llm_client.LRUCache(maxsize=16))
+    assert LLMClient(model="m1").generate_content("explain loops") == "reply 1 from m1"
+    assert models.calls == 1
+
+
+def test_cache_key_covers_prompt_system_instruction_and_model(models):
+    LLMClient(model="m1").generate_content("explain loops", system_instruction="tutor")
+    LLMClient(model="m1").generate_content("explain recursion", system_instruction="tutor")
+    LLMClient(model="m1").generate_content("explain loops", system_instruction="planner")
+    LLMClient(model="m1").generate_content("explain loops")
+    assert LLMClient(model="m2").generate_content("explain loops", system_instruction="tutor") == "reply 5 from m2"
+    assert models.calls == 5
+
+
+def test_volatile_prompts_and_disabled_cache_always_call_the_model(models, monkeypatch):
+    client = LLMClient(model="m1")
+    for _ in range(2):
+        client.generate_content("progress as of 2024-05-01T10:00")
+    assert models.calls == 2
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "0")
+    for _ in range(2):
+        client.generate_content("explain loops")
+    assert models.calls == 4
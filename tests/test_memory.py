@@ -3,13 +3,26 @@
 
 This test ensures append_event, get and compact_session behave as expected.
 """
+import multiprocessing
 import uuid
 
+from personalized_learning_coach.memory import kv_store
+from personalized_learning_coach.utils import jsonfast
 from personalized_learning_coach.memory.kv_store import (
+    _forget_cache,
     _reset_store,
     append_event,
+    append_events,
     get,
+    put,
+    put_batch,
     compact_session,
+    needs_compact,
+    append_message,
+    append_messages,
+    load_chat_meta,
+    load_messages,
+    replace_messages,
 )
 
 
@@ -40,4 +53,223 @@ def test_append_and_compact():
     )
     assert "events" in compacted and len(compacted["events"]) == 2, (
         f"Expected 2 events after compact, got {len(compacted.get('events', []))}"
-    )
\ No newline at end of file
+    )
+
+def test_chat_transcript_append_and_replace():
+    ns = f"chat:unittest:{uuid.uuid4().hex}"
+
+    append_message(ns, "default", {"role": "user", "content": "hi"})
+    append_message(ns, "default", {"role": "assistant", "content": "hello"})
+    assert [m["content"] for m in load_messages(ns, "default")] == ["hi", "hello"]
+
+    # Replacing the transcript (e.g. clearing it) drops earlier lines
+    replace_messages(ns, "default", [])
+    assert load_messages(ns, "default") == []
+
+
+def test_chat_transcript_keeps_a_metadata_file():
+    ns = f"chat:unittest:{uuid.uuid4().hex}"
+    assert load_chat_meta(ns, "p1_w0") == {}
+
+    append_messages(ns, "p1_w0", [{"content": "a"}, {"content": "b"}], {"plan_id": "p1", "week_index": 0})
+    append_message(ns, "p1_w0", {"content": "c"})
+    meta = load_chat_meta(ns, "p1_w0")
+    assert (meta["chat_key"], meta["message_count"], meta["plan_id"], meta["week_index"]) == ("p1_w0", 3, "p1", 0)
+    assert meta["updated_at"].endswith("Z")
+
+    replace_messages(ns, "p1_w0", [{"content": "only"}])
+    assert load_chat_meta(ns, "p1_w0")["message_count"] == 1
+
+    # Transcripts written before the metadata file existed are counted once
+    path = kv_store._chat_path(ns, "old") # pylint: disable=protected-access
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'{"content": "x"}\n{"content": "y"}\n')
+    append_message(ns, "old", {"content": "z"})
+    assert load_chat_meta(ns, "old")["message_count"] == 3
+
+
+def test_append_events_batch():
+    ns = f"session:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+
+    append_events(ns, [{"role": "user", "type": "answer", "content": {"qid": str(i)}} for i in range(3)])
+    append_events(ns, [])
+
+    events = get(ns, "events")
+    assert [e["content"]["qid"] for e in events] == ["0", "1", "2"]
+    assert all("timestamp" in e and "event_id" in e for e in events)
+    assert get(ns, "state")["last_event_ts"] == events[-1]["timestamp"]
+
+
+def test_needs_compact_counts_events_since_last_compaction():
+    ns = f"session:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+
+    assert needs_compact(ns, interval=3) is False
+    append_events(ns, [{"role": "user", "type": "utterance", "content": {"text": "a"}}] * 2)
+    assert needs_compact(ns, interval=3) is False
+    append_event(ns, {"role": "user", "type": "utterance", "content": {"text": "b"}})
+    assert needs_compact(ns, interval=3) is True
+
+    compact_session(ns, keep_last=1)
+    assert needs_compact(ns, interval=3) is False
+
+
+def test_session_update_many_merges_keys():
+    from personalized_learning_coach.memory.session import Session
+
+    _reset_store()
+    session = Session(f"session:unittest:{uuid.uuid4().hex}")
+    session.update_state("a", 1)
+
+    session.update_many({"b": 2, "c": [3]})
+    session.update_many({})
+
+    state = session.get_state()
+    assert (state["a"], state["b"], state["c"]) == (1, 2, [3])
+
+
+def test_put_batch_merges_into_namespace():
+    ns = f"user:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+    put(ns, "kept", 1)
+
+    put_batch(ns, {"a": [1, 2], "b": {"x": "y"}})
+
+    assert get(ns, "kept") == 1
+    assert get(ns, "a") == [1, 2]
+    assert get(ns, "b") == {"x": "y"}
+
+
+def test_values_do_not_alias_the_store():
+    from personalized_learning_coach.memory.manager import MemoryManager
+
+    ns = f"user:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+    written = {"items": [{"content": "a"}]}
+    put(ns, "doc", written)
+    written["items"].append({"content": "b"})
+
+    read = get(ns, "doc")
+    read["items"][0]["content"] = "changed"
+    get(ns)["doc"]["items"].clear()
+    assert get(ns, "doc") == {"items": [{"content": "a"}]}
+
+    manager = MemoryManager(f"unittest:{uuid.uuid4().hex}")
+    manager.add_memory("first")
+    manager.get_memories().append({"content": "unsaved"})
+    manager.add_memory("second")
+    assert [m["content"] for m in manager.get_memories()] == ["first", "second"]
+
+
+def test_logged_events_survive_reload_and_compaction():
+    ns = f"session:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+    append_event(ns, {"role": "user", "type": "utterance", "content": {"text": "one"}})
+    append_events(ns, [
+        {"role": "user", "type": "utterance", "content": {"text": "two"}},
+        {"role": "user", "type": "utterance", "content": {"text": "three"}},
+    ])
+
+    # Events after the first only live in the append log until the next shard write
+    _forget_cache()
+    sess = get(ns, "")
+    assert [e["content"]["text"] for e in sess["events"]] == ["one", "two", "three"]
+    assert sess["state"]["events_since_compact"] == 3
+
+    compact_session(ns, keep_last=1)
+    append_event(ns, {"role": "user", "type": "utterance", "content": {"text": "four"}})
+    _forget_cache()
+    assert [e["content"]["text"] for e in get(ns, "events")] == ["three", "four"]
+
+
+def test_torn_log_line_waits_until_completed():
+    ns = f"session:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+    append_event(ns, {"role": "user", "type": "utterance", "content": {"text": "one"}})
+    append_event(ns, {"role": "user", "type": "utterance", "content": {"text": "two"}})
+
+    # Another process is halfway through appending a line to the live log
+    line = jsonfast.dumpb({
+        "role": "user", "type": "utterance", "content": {"text": "three"}, "timestamp": "2024-01-01T00:00:00Z",
+    }) + b"\n"
+    log = kv_store._log_path(ns, kv_store._log_gens[ns]) # pylint: disable=protected-access
+    with open(log, "ab") as f:
+        f.write(line[:15])
+    assert len(get(ns, "events")) == 2
+    _forget_cache()
+    assert len(get(ns, "events")) == 2
+
+    with open(log, "ab") as f:
+        f.write(line[15:])
+    assert [e["content"]["text"] for e in get(ns, "events")] == ["one", "two", "three"]
+    _forget_cache()
+    assert [e["content"]["text"] for e in get(ns, "events")] == ["one", "two", "three"]
+
+
+def _interleave_writes(store_dir, session_ns, user_ns, worker, count):
+    # Spawned processes import kv_store afresh, so point them at the test's store too
+    kv_store.STORE_FILE = store_dir / "store.json"
+    kv_store.SHARDS_DIR = store_dir / "ns"
+    for i in range(count):
+        append_events(session_ns, [{"role": "user", "type": "utterance", "content": {"text": f"{worker}-{i}"}}])
+        put(user_ns, f"{worker}-{i}", i)
+
+
+def test_append_events_and_put_from_two_processes(isolated_store):
+    session_ns = f"session:unittest:{uuid.uuid4().hex}"
+    user_ns = f"user:unittest:{uuid.uuid4().hex}"
+    _reset_store()
+    append_event(session_ns, {"role": "system", "type": "system", "content": "start"})
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_interleave_writes, args=(isolated_store, session_ns, user_ns, w, 25)) for w in ("a", "b")]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=60)
+    assert [p.exitcode for p in workers] == [0, 0]
+
+    _forget_cache()
+    texts = [e["content"]["text"] for e in get(session_ns, "events")[1:]]
+    for w in ("a", "b"):
+        assert [t for t in texts if t.startswith(f"{w}-")] == [f"{w}-{i}" for i in range(25)]
+    assert len(texts) == 50
+    assert get(session_ns, "state")["events_since_compact"] == 51
+    assert sorted(get(user_ns)) == sorted(f"{w}-{i}" for w in ("a", "b") for i in range(25))
+
+
+def test_add_memories_stores_batch_in_order():
+    from personalized_learning_coach.memory.manager import MemoryManager
+
+    _reset_store()
+    manager = MemoryManager(f"unittest:{uuid.uuid4().hex}")
+    manager.add_memory("first")
+
+    manager.add_memories([("second", {"source_session": "s1"}), ("  ", None), ("third", None)])
+
+    memories = manager.get_memories()
+    assert [m["content"] for m in memories] == ["first", "second", "third"]
+    assert memories[1]["metadata"] == {"source_session": "s1"}
+    assert memories[2]["metadata"] == {}
+
+
+def test_get_memories_query_uses_index_and_rebuilds_it_on_change():
+    from personalized_learning_coach.memory.manager import MemoryManager
+
+    _reset_store()
+    manager = MemoryManager(f"unittest:{uuid.uuid4().hex}")
+    manager.add_memories([("User struggles with Recursion", None), ("Likes loops", None), ("recursion quiz score 4", None)])
+
+    assert [m["content"] for m in manager.get_memories("RECURSION")] == [
+        "User struggles with Recursion", "recursion quiz score 4",
+    ]
+    assert manager.get_memories("lo")[0]["content"] == "Likes loops"
+    assert manager.get_memories("missing") == []
+
+    # Items changed behind the manager's back, even at the same count, are reindexed
+    items = get(manager.namespace, "items")
+    put(manager.namespace, "items", [{"content": "more recursion"}] + items[1:])
+    assert [m["content"] for m in manager.get_memories("recursion")] == ["more recursion", "recursion quiz score 4"]
+    assert [m["content"] for m in manager.get_memories("struggles")] == []
+    assert get(manager.namespace, "trigram_index") is None
@@ -0,0 +1,177 @@
+"""Tests for OrchestratorAgent turn handling."""
+import uuid
+
+import pytest
+
+from personalized_learning_coach.agents.orchestrator import (
+    BULK_PARSE_STATS,
+    INTENT_STATS,
+    OrchestratorAgent,
+    _parse_numbered_answers,
+)
+from personalized_learning_coach.memory import kv_store
+
+
+class _StreamingLLM:
+    """Stub LLM client that streams a fixed list of chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content_stream(self, prompt, system_instruction=None, max_tokens=512):
+        yield from self.chunks
+
+
+@pytest.fixture
+def orch(monkeypatch):
+    monkeypatch.setenv("USE_GEMINI", "0")
+    return OrchestratorAgent(f"unittest:{uuid.uuid4().hex}")
+
+
+def _answer(orch, chunks):
+    orch.llm = _StreamingLLM(chunks)
+    return "".join(orch._tutor_answer("prompt", "question")) # pylint: disable=protected-access
+
+
+def test_tutor_answer_passes_plain_text_through(orch):
+    chunks = ["Loops repeat ", "a block of code. ", "SWITCH", " is not a signal."]
+    assert _answer(orch, chunks) == "".join(chunks)
+
+
+@pytest.mark.parametrize("chunks, before", [
+    (["Sure, happy to help with that. SWITCH_TOPIC: Rust"], "Sure, happy to help with that."),
+    (["Here is the explanation. ", "Also more. SWI", "TCH_TOPIC: Go"], "Here is the explanation. Also more."),
+    (["SWITCH_TO", "PIC: Go\n"], ""),
+])
+def test_tutor_answer_keeps_text_before_a_split_signal(orch, chunks, before):
+    reply = _answer(orch, chunks)
+
+    head, sep, tail = reply.partition("I've created a **new learning path**")
+    assert sep
+    assert head == (before + "\n\n" if before else "")
+    assert "SWITCH_TOPIC" not in reply
+    assert orch.state["active_plan_id"] in orch.state["plans"]
+    assert tail.startswith(" for **")
+
+
+def test_tutor_answer_without_streaming_keeps_text_before_the_signal(orch):
+    class _BlockingLLM:
+        def generate_content(self, prompt, system_instruction=None, max_tokens=512):
+            return "Good question. SWITCH_TOPIC: Rust"
+
+    orch.llm = _BlockingLLM()
+    reply = "".join(orch._tutor_answer("prompt", "question")) # pylint: disable=protected-access
+    assert reply.startswith("Good question.\n\nI've created a **new learning path** for **Rust**")
+
+
+def _routed_intent(orch, text):
+    """The intent branch one turn of text was routed to."""
+    before = INTENT_STATS.copy()
+    orch.run(text)
+    (intent,) = INTENT_STATS - before
+    return intent
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("quiz me on loops", "quiz"),
+    ("Can I get some assessments?", "quiz"),
+    ("I'd like quizzing on fractions", "quiz"),
+    ("please assess my python", "quiz"),
+    ("test me on python", "quiz"),
+    ("create a new course on rust", "plan"),
+    ("I want to learn rust", "plan"),
+    ("tell me about planets", "chat"),
+    ("address this for me", "chat"),
+    ("ok", "lesson"),
+    ("Okay!", "lesson"),
+    ("go on.", "lesson"),
+    ("yes please", "lesson"),
+    ("sure thing mate", "chat"),
+    ("I'm done", "finished"),
+])
+def test_intent_routing(orch, text, intent):
+    assert _routed_intent(orch, text) == intent
+
+
+def test_learn_words_only_start_a_plan_without_an_active_one(orch):
+    orch.create_plan("Rust", {"weeks": [{"topic": "Ownership"}]})
+    assert _routed_intent(orch, "study tips for this") == "chat"
+    assert _routed_intent(orch, "add a plan for go") == "plan"
+
+
+_QUESTIONS = [{"qid": f"q{i}", "prompt": f"Question {i}"} for i in range(1, 5)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("q1: A\nQ2 - for loops\n3. 42\n4) O(n)", {"q1": "A", "q2": "for loops", "q3": "42", "q4": "O(n)"}),
+    ("Here are my answers:\n1. A\n2. B", {"q1": "A", "q2": "B"}),
+    ("1. first\n1. again\n9. out of range", {"q1": "first"}),
+    ("1.5 is my answer", {}),
+    ("3.14\n2.71", {}),
+    ("I have two questions first:\n1. What does q2 mean?\n2. Is it multiple choice?", {}),
+    ("The answer is 2 apples", {}),
+])
+def test_parse_numbered_answers(text, expected):
+    assert _parse_numbered_answers(text, _QUESTIONS) == expected
+
+
+def test_bulk_answers_skip_the_llm_only_for_numbered_answers(orch):
+    class _ParserLLM:
+        calls = 0
+
+        def generate_content(self, prompt, system_instruction=None, max_tokens=512):
+            self.calls += 1
+            return '{"q1": "from llm"}'
+
+    orch.llm = llm = _ParserLLM()
+    before = BULK_PARSE_STATS.copy()
+
+    numbered = orch._parse_bulk_answers("1. A\n2. B\n3. C", _QUESTIONS) # pylint: disable=protected-access
+    question = orch._parse_bulk_answers( # pylint: disable=protected-access
+        "Quick check before I answer:\n1. Is q1 about loops?\n2. Can I use Python?", _QUESTIONS
+    )
+
+    assert numbered == {"q1": "A", "q2": "B", "q3": "C"}
+    assert question == {"q1": "from llm"}
+    assert llm.calls == 1
+    assert BULK_PARSE_STATS - before == {"heuristic": 1, "llm": 1}
+
+
+def test_saved_state_round_trips_through_the_session(orch):
+    plan_id = orch.create_plan("Rust", {"weeks": [{"topic": "Ownership"}, {"topic": "Traits"}], "goal": "ship"})
+    orch.state["proposed_topic"] = "Go"
+    orch._save_state() # pylint: disable=protected-access
+
+    # Change plan meta and body, add a plan and drop a top-level key
+    orch.switch_week(plan_id, 1)
+    orch.state["plans"][plan_id]["weeks"][0]["completed"] = True
+    orch.create_plan("Go", {"weeks": [{"topic": "Goroutines"}]})
+    del orch.state["proposed_topic"]
+    orch._save_state() # pylint: disable=protected-access
+
+    kv_store._forget_cache() # pylint: disable=protected-access
+    reloaded = OrchestratorAgent(orch.user_id)
+
+    # The session's event bookkeeping shares the stored state but is not orchestrator state
+    assert {k: v for k, v in reloaded.state.items() if k not in ("events_since_compact", "last_event_ts")} == orch.state
+    assert "proposed_topic" not in reloaded.state
+    plan = reloaded.state["plans"][plan_id]
+    assert plan["current_topic"] == "Traits"
+    assert plan["weeks"] is plan["data"]["weeks"]
+    assert plan["weeks"][0]["completed"] is True
+    stored = kv_store.get(orch.user_id, "state")
+    assert set(stored["plans"][plan_id]) <= {
+        "id", "main_topic", "current_topic", "active_week_index", "progress", "pending_review", "last_assessment_result",
+    }
+    assert stored["plans_data"][plan_id]["data"]["goal"] == "ship"
+
+
+def test_flushed_chat_records_plan_and_week_metadata(orch):
+    orch.append_chat_message("ab12cd34_w2", {"role": "user", "content": "hi", "_ui_only": True})
+    orch.append_chat_message("default", {"role": "user", "content": "hello"})
+    orch.flush_chat_history()
+
+    assert kv_store.load_messages(orch.chat_ns, "ab12cd34_w2") == [{"role": "user", "content": "hi"}]
+    meta = kv_store.load_chat_meta(orch.chat_ns, "ab12cd34_w2")
+    assert (meta["plan_id"], meta["week_index"], meta["message_count"]) == ("ab12cd34", 2, 1)
+    assert "plan_id" not in kv_store.load_chat_meta(orch.chat_ns, "default")
@@ -0,0 +1,79 @@
+"""Tests for the PlannerAgent cross-user plan cache."""
+import uuid
+
+import pytest
+
+from personalized_learning_coach.agents import planner_agent
+from personalized_learning_coach.agents.planner_agent import PlannerAgent, _plan_cache_key
+
+
+class _PlanLLM:
+    """Stub LLM client returning one fixed plan and counting calls."""
+
+    def __init__(self, plan_json):
+        self.plan_json = plan_json
+        self.calls = 0
+
+    def generate_content(self, prompt, system_instruction=None, max_tokens=512):
+        self.calls += 1
+        return self.plan_json
+
+
+_PLAN = (
+    '{"weeks": [{"topic": "python loops basics", "goal": "Write Python loops", "activities": ["Use {topic} in a {dict}"]}],'
+    ' "summary": "A plan for python loops"}'
+)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setenv("PLC_PLAN_CACHE", "1")
+    planner_agent._PLAN_CACHE.clear() # pylint: disable=protected-access
+    return _PlanLLM(_PLAN)
+
+
+def _plan(llm, topic, assessment=None):
+    planner = PlannerAgent(f"unittest:{uuid.uuid4().hex}", llm_client=llm)
+    return planner.run({"topic": topic, "assessment_data": assessment})
+
+
+def test_plan_is_reused_across_users(llm):
+    first = _plan(llm, "python loops")
+    second = _plan(llm, "python loops")
+    assert llm.calls == 1
+    assert second == first
+
+
+def test_plan_cache_misses_on_other_topic_or_assessment(llm):
+    _plan(llm, "python loops")
+    _plan(llm, "rust traits")
+    _plan(llm, "python loops", assessment={"score": 0.4})
+    assert llm.calls == 3
+
+
+def test_plan_cache_key_ignores_case_and_spacing():
+    assert _plan_cache_key("Python  Loops ", None) == _plan_cache_key("python loops", None)
+    assert _plan_cache_key("python loops", None) != _plan_cache_key("python loops", {"score": 1})
+
+
+def test_cached_plan_is_restored_for_the_callers_spelling(llm):
+    _plan(llm, "python loops")
+    plan = _plan(llm, "Python Loops")
+
+    assert llm.calls == 1
+    assert plan["weeks"][0]["topic"] == "Python Loops basics"
+    # Differently cased mentions are the model's wording and stay as written
+    assert plan["weeks"][0]["goal"] == "Write Python loops"
+    assert plan["summary"] == "A plan for Python Loops"
+
+
+def test_literal_placeholder_in_model_output_survives(llm):
+    first = _plan(llm, "python loops")
+    cached = _plan(llm, "python loops")
+    assert first["weeks"][0]["activities"] == ["Use {topic} in a {dict}"]
+    assert cached["weeks"][0]["activities"] == ["Use {topic} in a {dict}"]
+
+    # Also after a restart, from the persisted template
+    planner_agent._PLAN_CACHE.clear() # pylint: disable=protected-access
+    assert _plan(llm, "python loops")["weeks"][0]["activities"] == ["Use {topic} in a {dict}"]
+    assert llm.calls == 1
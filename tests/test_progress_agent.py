@@ -0,0 +1,100 @@
+"""Tests for ProgressAgent mastery tracking and its EMA kernel."""
+import uuid
+
+import numpy as np
+import pytest
+
+from personalized_learning_coach.agents import progress_kernels
+from personalized_learning_coach.agents.progress_agent import LEGACY_PROFILES_KEY, PROFILES_KEY, ProgressAgent
+from personalized_learning_coach.agents.progress_kernels import (
+    TREND_DECLINING, TREND_IMPROVING, TREND_STABLE, TREND_THRESHOLD, ema_update,
+)
+from personalized_learning_coach.memory.kv_store import get, put
+
+
+def _reference_ema(prev, score, alpha):
+    """Plain-Python EMA and trend, one element at a time."""
+    new, delta, trend = [], [], []
+    for p, s, a in zip(prev, score, alpha):
+        n = p * (1 - a) + s * a
+        new.append(n)
+        delta.append(n - p)
+        trend.append(TREND_IMPROVING if n - p > TREND_THRESHOLD else TREND_DECLINING if n - p < -TREND_THRESHOLD else TREND_STABLE)
+    return new, delta, trend
+
+
+def _random_inputs(n=257, seed=7):
+    rng = np.random.default_rng(seed)
+    prev = rng.random(n, dtype=np.float32)
+    score = rng.random(n, dtype=np.float32)
+    score[:5] = prev[:5]  # unchanged mastery must read as stable
+    alpha = np.where(rng.random(n) < 0.2, 1.0, 0.3).astype(np.float32)
+    return prev, score, alpha
+
+
+def test_ema_update_matches_plain_python():
+    prev, score, alpha = _random_inputs()
+    new, delta, trend = ema_update(prev, score, alpha)
+    ref_new, ref_delta, ref_trend = _reference_ema(prev.tolist(), score.tolist(), alpha.tolist())
+
+    np.testing.assert_allclose(new, ref_new, atol=1e-6)
+    np.testing.assert_allclose(delta, ref_delta, atol=1e-6)
+    assert trend.dtype == np.int8
+    # Trends can only differ where delta sits on the threshold within float32 rounding
+    near = np.abs(np.abs(np.asarray(ref_delta)) - TREND_THRESHOLD) < 1e-6
+    assert (trend[~near] == np.asarray(ref_trend)[~near]).all()
+    assert (trend[:5] == TREND_STABLE).all()
+
+
+def test_numba_kernel_matches_numpy_kernel():
+    pytest.importorskip("numba")
+    prev, score, alpha = _random_inputs()
+    jit = progress_kernels._ema_update_jit(prev, score, alpha) # pylint: disable=protected-access
+    ref = progress_kernels._ema_update_numpy(prev, score, alpha) # pylint: disable=protected-access
+    np.testing.assert_allclose(jit[0], ref[0], atol=1e-6)
+    np.testing.assert_allclose(jit[1], ref[1], atol=1e-6)
+    assert (jit[2] == ref[2]).all()
+
+
+def test_first_score_of_a_new_skill_is_taken_as_is():
+    agent = ProgressAgent(f"unittest:{uuid.uuid4().hex}", alpha=0.3)
+    agent.run({"skill_id": "old", "score": 0.5})
+
+    res = agent.run({"results": [
+        {"skill_id": "new", "score": 0.8},
+        {"skill_id": "old", "score": 1.0},
+        {"skill_id": "new", "score": 0.2},
+    ]})["results"]
+
+    # Fresh row: alpha 1 for its first result only, then repeats compound with alpha
+    assert res[0]["new_mastery"] == pytest.approx(0.8, abs=1e-3)
+    assert res[2]["new_mastery"] == pytest.approx(0.8 * 0.7 + 0.2 * 0.3, abs=1e-3)
+    # Existing row: plain EMA
+    assert res[1]["new_mastery"] == pytest.approx(0.5 * 0.7 + 1.0 * 0.3, abs=1e-3)
+    assert res[1]["trend_summary"] == "improving"
+    assert res[2]["trend_summary"] == "declining"
+    profiles = agent.get_skill_profiles()
+    assert list(profiles) == ["old", "new"]
+    assert profiles["new"]["mastery_score"] == pytest.approx(0.62, abs=1e-3)
+
+
+def test_legacy_profiles_are_migrated_once():
+    user_id = f"unittest:{uuid.uuid4().hex}"
+    namespace = f"user:{user_id}"
+    put(namespace, LEGACY_PROFILES_KEY, [
+        {"skill_id": "loops", "mastery_score": 0.4, "last_practiced": "2024-01-01T00:00:00Z"},
+        {"skill_id": "recursion", "mastery_score": 0.9, "last_practiced": "2024-01-02T00:00:00Z"},
+        {"mastery_score": 1.0},  # no skill_id: dropped
+    ])
+    agent = ProgressAgent(user_id)
+
+    profiles = agent.get_skill_profiles()
+    assert list(profiles) == ["loops", "recursion"]
+    assert profiles["loops"]["mastery_score"] == pytest.approx(0.4)
+    assert profiles["recursion"]["last_practiced"] == "2024-01-02T00:00:00Z"
+    assert get(namespace, PROFILES_KEY)["schema"] == 2
+
+    # The columnar copy is authoritative from now on
+    put(namespace, LEGACY_PROFILES_KEY, [{"skill_id": "stale", "mastery_score": 0.1}])
+    assert list(agent.get_skill_profiles()) == ["loops", "recursion"]
+    assert agent.run({"skill_id": "loops", "score": 1.0})["new_mastery"] == pytest.approx(0.58, abs=1e-3)
@@ -0,0 +1,35 @@
+"""Tests for the agent tracer."""
+import json
+
+from observability import tracer
+from observability.tracer import ARG_PREVIEW_CHARS, flush_traces, trace_agent
+
+
+class EchoAgent:
+    @trace_agent
+    def run(self, payload, note=None):
+        return "ok"
+
+
+def _records():
+    flush_traces()
+    with open(tracer.TRACE_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_trace_args_are_bounded_reprs():
+    payload = {"topic": "x" * 10_000, "answers": {str(i): "A" for i in range(100)}}
+    EchoAgent().run(payload, note="short")
+
+    start = next(r for r in _records() if r["event"] == "agent_start")
+    (arg,) = start["args"]
+    assert len(arg) < 2 * ARG_PREVIEW_CHARS
+    assert arg.startswith("{'answers': {") and "..." in arg
+    assert start["kwargs"] == {"note": "'short'"}
+
+
+def test_trace_long_string_arg_is_truncated():
+    EchoAgent().run("y" * 10_000)
+
+    start = next(r for r in _records() if r["event"] == "agent_start")
+    assert len(start["args"][0]) == ARG_PREVIEW_CHARS
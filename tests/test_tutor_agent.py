@@ -0,0 +1,85 @@
+"""Tests for TutorAgent lesson caching and async generation."""
+import asyncio
+
+from personalized_learning_coach.agents.tutor_agent import TutorAgent, _lesson_key
+
+
+class _CountingLLM:
+    """Stub LLM client returning a fixed markdown lesson and counting calls."""
+
+    model = "stub-tutor-test"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, system_instruction=None, max_tokens=512):
+        self.calls += 1
+        return f"## Overview\nLesson {self.calls}"
+
+
+class _AsyncLLM:
+    """Stub async LLM client that records how many calls overlap."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def agenerate_content(self, prompt, system_instruction=None, max_tokens=512):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        topic = prompt.split("'")[1]
+        return f"## Overview\nLesson for {topic}"
+
+
+def test_lesson_key_keeps_symbol_topics_apart():
+    keys = {_lesson_key(topic, "m") for topic in ("C", "C++", "C#", "F#", ".NET", "NET")}
+    assert len(keys) == 6
+
+
+def test_lesson_key_ignores_case_spacing_and_trailing_punctuation():
+    assert _lesson_key("Python Loops", "m") == _lesson_key("  python   loops? ", "m")
+    assert _lesson_key("Python Loops", "m") != _lesson_key("Python Loops", "other-model")
+
+
+def test_run_reuses_lesson_only_for_equivalent_topics():
+    llm = _CountingLLM()
+    tutor = TutorAgent("tutor-test", llm_client=llm)
+
+    first = tutor.run({"topic": "C"})
+    again = tutor.run({"topic": "c."})
+    other = tutor.run({"topic": "C++"})
+
+    assert llm.calls == 2
+    assert again["lesson_content"] == first["lesson_content"]
+    assert again["topic"] == "c."
+    assert other["lesson_content"] != first["lesson_content"]
+
+
+def test_arun_generates_then_serves_from_cache():
+    llm = _AsyncLLM("stub-tutor-arun")
+    tutor = TutorAgent("tutor-test", llm_client=llm)
+
+    first = asyncio.run(tutor.arun({"topic": "Recursion"}))
+    again = asyncio.run(tutor.arun({"topic": "recursion"}))
+
+    assert llm.calls == 1
+    assert "Recursion" in first["lesson_content"]["overview"]
+    assert again["lesson_content"] == first["lesson_content"]
+
+
+def test_arun_many_keeps_order_dedupes_and_bounds_concurrency():
+    llm = _AsyncLLM("stub-tutor-arun-many")
+    tutor = TutorAgent("tutor-test", llm_client=llm)
+    topics = ["T1", "T2", "T3", "T1", "T4", "T5"]
+
+    lessons = asyncio.run(tutor.arun_many([{"topic": t} for t in topics], concurrency=2))
+
+    assert [lesson["topic"] for lesson in lessons] == topics
+    assert all(f"Lesson for {t}" in lesson["lesson_content"]["overview"] for t, lesson in zip(topics, lessons))
+    assert llm.calls == 5
+    assert llm.peak == 2